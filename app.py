@@ -1,7 +1,13 @@
 import os
-from flask import Flask, render_template, request, jsonify
+import datetime
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
-from file_processing_backend.text_extractor import process_document
+from file_processing_backend.text_extractor import run_document_job, warm_up
+from file_processing_backend.export import XlsxStream, iter_rows, stream_csv, validate_delimiter
+from file_processing_backend.reprocess import DEFAULT_CONCURRENCY, reprocess_documents, validate_concurrency, validate_version
+from file_processing_backend.profiling import profile_path, summarize_profile
+from file_processing_backend.scheduler import CostModel, JobScheduler, SchedulerBusy
+from file_processing_backend.job_queue import JobQueue
 import json
 
 app = Flask(__name__)
@@ -14,6 +20,26 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Планировщик: короткие документы вперёд, длинные не голодают за счёт старения.
+# Один документ и так занимает несколько ядер (полосы предобработки, Tesseract),
+# поэтому воркеров — половина ядер, но не меньше двух: пока один документ ждёт
+# ответа LLM, другой распознаётся. Переопределяется EXTRACTOR_WORKERS.
+SCHEDULER_WORKERS = int(os.environ.get('EXTRACTOR_WORKERS') or max((os.cpu_count() or 1) // 2, 2))
+MAX_BACKLOG_SECONDS = 900
+cost_model = CostModel.from_history(UPLOAD_FOLDER)
+job_scheduler = JobScheduler(
+    cost_model,
+    workers=SCHEDULER_WORKERS,
+    max_backlog_seconds=MAX_BACKLOG_SECONDS,
+    worker_init=warm_up
+)
+
+# Режим нескольких машин: если задан EXTRACTOR_QUEUE (путь к SQLite на общем
+# хранилище), документы обрабатывают воркеры worker.py, а приложение только
+# ставит задачи в очередь и читает результаты
+JOB_QUEUE_PATH = os.environ.get('EXTRACTOR_QUEUE')
+job_queue = JobQueue(JOB_QUEUE_PATH) if JOB_QUEUE_PATH else None
+
 # Список обработанных файлов
 processed_files = []
 
@@ -216,16 +242,38 @@ def upload_file():
         
         try:
             # === ЗАПУСК ОБРАБОТКИ ===
-            result = process_document(filepath, settings)
+            stats = {}
+            profile = request.form.get('profile', request.args.get('profile', '')).lower() in ('1', 'true', 'yes')
+            try:
+                if job_queue is not None:
+                    features, predicted = cost_model.predict_document(filepath)
+                    job_id = job_queue.submit(
+                        filename, settings, profile=profile,
+                        predicted_seconds=predicted, max_backlog_seconds=MAX_BACKLOG_SECONDS
+                    )
+                else:
+                    job = job_scheduler.submit(filepath, run_document_job, filepath, settings, stats=stats, profile=profile)
+            except SchedulerBusy as busy:
+                response = jsonify({
+                    'error': str(busy),
+                    'filename': filename,
+                    'retry_after': busy.retry_after,
+                    'status': 'busy'
+                })
+                response.headers['Retry-After'] = str(busy.retry_after)
+                return response, 429
+
+            # Результат (<имя>_result.json) сохраняет тот, кто обработал документ.
+            # Запрос держится до результата, как и без очереди: фронтенд не меняется
+            if job_queue is not None:
+                result, stats = job_queue.wait(job_id)
+                if 'total_seconds' in stats:
+                    cost_model.observe(features[0], features[1], stats['total_seconds'])
+            else:
+                result = job.wait()
             
             if result:
                 processed_files.append(filename)
-                
-                # Сохраняем результат
-                result_filename = f"{os.path.splitext(filename)[0]}_result.json"
-                result_path = os.path.join(app.config['UPLOAD_FOLDER'], result_filename)
-                with open(result_path, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, ensure_ascii=False, indent=4)
 
                 result_order = list(result.keys()) if isinstance(result, dict) else []
                 
@@ -234,6 +282,7 @@ def upload_file():
                     'filename': filename,
                     'result': result,
                     'result_order': result_order,
+                    'stats': stats,
                     'status': 'success'
                 })
             else:
@@ -250,5 +299,111 @@ def upload_file():
                 'status': 'error'
             }), 500
 
+@app.route('/reprocess', methods=['POST'])
+def reprocess():
+    """Перепрогоняет только LLM по сохранённому OCR с новыми настройками"""
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = {}
+    # Версия идёт в имена файлов в uploads/, параллельность — в размер пула потоков:
+    # проверяем запрос до любой работы
+    try:
+        if not isinstance(payload, dict):
+            raise ValueError("Ожидается JSON-объект")
+        version = validate_version(payload['version']) if payload.get('version') else None
+        concurrency = validate_concurrency(payload.get('concurrency', DEFAULT_CONCURRENCY))
+        documents = payload.get('documents')
+        if documents is not None and not (isinstance(documents, list) and all(isinstance(name, str) for name in documents)):
+            raise ValueError("documents должен быть списком имён файлов")
+        overrides = payload.get('settings')
+        if overrides is not None and not isinstance(overrides, dict):
+            raise ValueError("settings должен быть объектом")
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        settings = load_settings()
+        settings.update(overrides or {})
+
+        summary = reprocess_documents(
+            app.config['UPLOAD_FOLDER'],
+            settings,
+            names=documents,
+            version=version,
+            concurrency=concurrency
+        )
+        return jsonify({'status': 'success', **summary})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def _parse_date(value):
+    return datetime.date.fromisoformat(value) if value else None
+
+@app.route('/export', methods=['GET'])
+def export_results():
+    """Потоковая выгрузка всех результатов в CSV или XLSX.
+
+    Фильтры: since/until (ГГГГ-ММ-ДД, по дате файла результата), version
+    (версия перепрогона) и prefix (начало имени файла).
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'xlsx'):
+        return jsonify({'status': 'error', 'message': 'Поддерживаются форматы csv и xlsx'}), 400
+
+    try:
+        filters = {
+            'since': _parse_date(request.args.get('since')),
+            'until': _parse_date(request.args.get('until')),
+            'version': request.args.get('version') or None,
+            'prefix': request.args.get('prefix') or None,
+        }
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Неверная дата: {e}'}), 400
+
+    rows = iter_rows(app.config['UPLOAD_FOLDER'], **filters)
+    date = datetime.date.today().isoformat()
+
+    if export_format == 'csv':
+        # Неверный разделитель иначе всплыл бы TypeError посреди уже начатого ответа
+        try:
+            delimiter = validate_delimiter(request.args.get('delimiter', ','))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return Response(
+            stream_with_context(stream_csv(rows, delimiter=delimiter)),
+            mimetype='text/csv; charset=utf-8',
+            headers={'Content-Disposition': f'attachment; filename=results_{date}.csv'}
+        )
+
+    # XLSX — zip-архив: он пишется в фоновом потоке (write_only, постоянная память)
+    # и уходит клиенту по мере записи. Если ответ закрыт раньше, поток останавливается
+    xlsx_stream = XlsxStream(rows)
+    response = Response(
+        xlsx_stream,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f'attachment; filename=results_{date}.xlsx'}
+    )
+    response.call_on_close(xlsx_stream.close)
+    return response
+
+@app.route('/profile/<filename>', methods=['GET'])
+def get_profile(filename):
+    """Сводка профиля документа: топ функций по накопленному времени"""
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+    path = profile_path(filepath)
+    if not os.path.exists(path):
+        return jsonify({'status': 'error', 'message': 'Профиль не найден. Загрузите файл с profile=1'}), 404
+
+    try:
+        limit = int(request.args.get('limit', 20))
+        summary = summarize_profile(path, limit=limit)
+        return jsonify({'status': 'success', 'filename': filename, 'profile': summary})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 if __name__ == '__main__':
+    # В режиме debug родительский процесс перезагрузчика только следит за файлами:
+    # прогреваем воркеры лишь в процессе, который обслуживает запросы
+    if job_queue is None and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_scheduler.start()
     app.run(debug=True)
@@ -0,0 +1,208 @@
+import csv
+import datetime
+import io
+import json
+import os
+import threading
+
+# Фиксированный порядок полей — тот же, что в промте и в tools/benchmark_results.py
+RESULT_FIELDS = [
+    "Название_файла",
+    "Тип_документа",
+    "Номер_документа",
+    "Дата_документа",
+    "Наименование_заказчика",
+    "Наименование_исполнителя",
+    "ИНН_заказчика",
+    "ИНН_исполнителя",
+    "КПП_заказчика",
+    "КПП_исполнителя",
+    "Адрес_заказчика",
+    "Адрес_исполнителя",
+]
+
+RESULT_SUFFIX = '_result'
+
+
+def _result_suffix(version=None):
+    return f"{RESULT_SUFFIX}_{version}.json" if version else f"{RESULT_SUFFIX}.json"
+
+
+def iter_result_files(uploads_dir, version=None, since=None, until=None, prefix=None):
+    """Перебирает файлы результатов (по имени) с фильтрами по версии, дате и префиксу.
+
+    since/until — datetime.date, сравниваются с датой изменения файла
+    включительно. Держит в памяти только список имён, а не содержимое.
+    """
+    suffix = _result_suffix(version)
+    names = []
+    with os.scandir(uploads_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(suffix):
+                continue
+            if prefix and not entry.name.startswith(prefix):
+                continue
+            if since or until:
+                modified = datetime.date.fromtimestamp(entry.stat().st_mtime)
+                if (since and modified < since) or (until and modified > until):
+                    continue
+            names.append(entry.name)
+
+    for name in sorted(names):
+        yield name[:-len(suffix)], os.path.join(uploads_dir, name)
+
+
+def iter_rows(uploads_dir, **filters):
+    """Строки результатов в порядке RESULT_FIELDS; ошибки обработки пропускаются"""
+    for stem, path in iter_result_files(uploads_dir, **filters):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[EXPORT] Пропущен {os.path.basename(path)}: {e}")
+            continue
+        if not isinstance(result, dict) or 'error' in result:
+            continue
+
+        row = ['' if result.get(field) is None else str(result.get(field)) for field in RESULT_FIELDS]
+        if not row[0]:
+            row[0] = f"{stem}.pdf"
+        yield row
+
+
+def validate_delimiter(delimiter):
+    """Проверяет разделитель CSV до начала ответа; бросает ValueError"""
+    if not isinstance(delimiter, str) or len(delimiter) != 1 or delimiter in '"\r\n':
+        raise ValueError(f"Разделитель должен быть одним символом (не кавычкой и не переводом строки): {delimiter!r}")
+    return delimiter
+
+
+def stream_csv(rows, delimiter=','):
+    """Отдаёт CSV по кускам: заголовок и затем по строке на документ.
+
+    Начинается с BOM, чтобы Excel открыл кириллицу в UTF-8 без мастера импорта.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    writer.writerow(RESULT_FIELDS)
+    yield '\ufeff' + flush()
+    for row in rows:
+        writer.writerow(row)
+        yield flush()
+
+
+def write_xlsx(rows, output):
+    """Пишет XLSX потоково (write_only): память не растёт с числом строк"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Результаты обработки')
+    sheet.append(RESULT_FIELDS)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    try:
+        workbook.save(output)
+    except BaseException:
+        # Оборванная запись (клиент ушёл) оставляет временный файл листа openpyxl
+        # до выхода процесса: закрываем лист и удаляем файл сразу. Публичного API
+        # для этого нет, поэтому openpyxl закреплён на 3.1 в requirements.txt, а
+        # при другом устройстве писателя файл просто доживёт до выхода процесса
+        if not sheet.closed:
+            sheet.close()
+        writer = getattr(sheet, '_writer', None)
+        path = getattr(writer, 'out', None)
+        if path and os.path.exists(path) and hasattr(writer, 'cleanup'):
+            writer.cleanup()
+        raise
+    return count
+
+
+class _PipeWriter(io.RawIOBase):
+    """Запись в pipe целиком; после обрыва данные молча отбрасываются, иначе
+    недописанный ZipFile openpyxl шумит исключением из __del__"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.broken = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.broken:
+            return len(data)
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(self.fd, view):]
+        except BrokenPipeError:
+            self.broken = True
+            raise
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            os.close(self.fd)
+        super().close()
+
+
+class XlsxStream:
+    """XLSX, который пишется в фоновом потоке в pipe и отдаётся кусками по мере записи.
+
+    Запись начинается только при первой итерации, поэтому брошенный до начала
+    ответ ничего не оставляет. close() закрывает читающий конец: писатель
+    получает BrokenPipeError и завершается, а не висит на полном pipe.
+    """
+
+    def __init__(self, rows, chunk_size=64 * 1024):
+        self.rows = rows
+        self.chunk_size = chunk_size
+        self._reader = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __iter__(self):
+        # Пустой кусок: заголовки ответа уходят сразу, пока строки ещё пишутся
+        yield b''
+        with self._lock:
+            if self._closed:
+                return
+            read_fd, write_fd = os.pipe()
+            self._reader = open(read_fd, 'rb')
+        threading.Thread(target=self._write, args=(write_fd,), name='xlsx-export', daemon=True).start()
+        try:
+            while True:
+                chunk = self._reader.read1(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def _write(self, write_fd):
+        output = _PipeWriter(write_fd)
+        try:
+            count = write_xlsx(self.rows, output)
+            print(f"[EXPORT] XLSX: {count} строк")
+        except BrokenPipeError:
+            print("[EXPORT] Клиент закрыл соединение, выгрузка XLSX прервана")
+        except Exception as e:
+            # Заголовки уже отправлены: клиент получит обрезанный файл, причина — в логе
+            print(f"[EXPORT] Ошибка записи XLSX: {e}")
+        finally:
+            output.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._reader is not None:
+                self._reader.close()
@@ -0,0 +1,217 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from file_processing_backend.reprocess import public_settings
+from file_processing_backend.scheduler import SchedulerBusy, admission_retry_after
+
+# =========================================================
+# ОБЩАЯ ОЧЕРЕДЬ ЗАДАЧ НА SQLITE (НЕСКОЛЬКО МАШИН-ВОРКЕРОВ)
+# =========================================================
+# Веб-приложение только ставит задачи и читает результаты, воркеры (worker.py)
+# забирают их с арендой (lease) и продлевают её heartbeat'ом. Если воркер
+# умер, аренда истекает и задачу забирает другой. Файл базы лежит на общем
+# хранилище рядом с uploads; SQLite там работает в режиме rollback journal
+# (WAL на сетевых ФС не поддерживается), поэтому блокировки держим короткими.
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 0.5
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    settings TEXT,
+    profile INTEGER NOT NULL DEFAULT 0,
+    predicted_seconds REAL NOT NULL DEFAULT 0,
+    priority REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    stats TEXT,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+'''
+
+
+def make_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """Очередь документов с арендой задач, общая для веб-приложения и воркеров"""
+
+    def __init__(self, db_path, lease_seconds=LEASE_SECONDS, aging_rate=1.0):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.aging_rate = aging_rate
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Новое соединение на операцию: их можно звать из любых потоков
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ---------- сторона веб-приложения ----------
+
+    def submit(self, filename, settings=None, profile=False, predicted_seconds=0.0, max_backlog_seconds=None):
+        """Ставит документ в очередь; при переполнении бросает SchedulerBusy.
+
+        Секреты (apiKey) в общую базу не пишутся: воркер подставляет свои.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if max_backlog_seconds is not None:
+                retry_after = admission_retry_after(self._backlog_seconds(conn), predicted_seconds,
+                                                    self._active_workers(conn, now), max_backlog_seconds)
+                if retry_after is not None:
+                    conn.execute('ROLLBACK')
+                    raise SchedulerBusy(retry_after)
+
+            # Тот же ключ, что у JobScheduler: короткие вперёд, ожидание "старит" задачу
+            priority = predicted_seconds + self.aging_rate * now
+            cursor = conn.execute(
+                'INSERT INTO jobs (filename, settings, profile, predicted_seconds, priority, enqueued_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (filename, json.dumps(public_settings(settings), ensure_ascii=False) if settings else None,
+                 int(bool(profile)), predicted_seconds, priority, now)
+            )
+            conn.execute('COMMIT')
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def poll(self, job_id):
+        """(результат, статистика) завершённой задачи или None, пока она в работе"""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(f"Задача {job_id} не найдена")
+        if job['status'] == 'done':
+            return json.loads(job['result']) if job['result'] else None, json.loads(job['stats'] or '{}')
+        if job['status'] == 'failed':
+            raise RuntimeError(job['error'] or 'Задача завершилась с ошибкой')
+        return None
+
+    def wait(self, job_id, timeout=None, poll_interval=POLL_INTERVAL):
+        """Ждёт завершения задачи и возвращает (результат, статистика)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            outcome = self.poll(job_id)
+            if outcome is not None:
+                return outcome
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Задача {job_id} не завершилась за {timeout} с")
+            time.sleep(poll_interval)
+
+    def _backlog_seconds(self, conn):
+        row = conn.execute(
+            "SELECT COALESCE(SUM(predicted_seconds), 0) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()
+        return float(row[0])
+
+    def _active_workers(self, conn, now):
+        row = conn.execute('SELECT COUNT(*) FROM workers WHERE last_seen > ?', (now - self.lease_seconds,)).fetchone()
+        return int(row[0])
+
+    # ---------- сторона воркера ----------
+
+    def claim(self, worker_id):
+        """Забирает самую приоритетную свободную задачу (или с истёкшей арендой)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT OR REPLACE INTO workers (id, last_seen) VALUES (?, ?)', (worker_id, now))
+
+            # Задачи мёртвых воркеров, исчерпавшие попытки, больше не крутим
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                ('Воркер не завершил задачу за отведённые попытки', now, now, MAX_ATTEMPTS)
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY priority LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+
+            if row['status'] == 'running':
+                print(f"[QUEUE] Задача {row['id']} отобрана у {row['worker']}: аренда истекла")
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker_id, now + self.lease_seconds, row['id'])
+            )
+            conn.execute('COMMIT')
+            job = dict(row)
+            job['settings'] = json.loads(job['settings']) if job['settings'] else None
+            return job
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id, worker_id):
+        """Продлевает аренду; False — задачу уже забрал кто-то другой"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO workers (id, last_seen) VALUES (?, ?)', (worker_id, now))
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (now + self.lease_seconds, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, job_id, worker_id, result, stats=None):
+        return self._finish(job_id, worker_id, 'done', result=result, stats=stats)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, 'failed', error=error)
+
+    def _finish(self, job_id, worker_id, status, result=None, stats=None, error=None):
+        conn = self._connect()
+        try:
+            # Настройки завершённой задаче больше не нужны
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, stats = ?, error = ?, finished_at = ?, lease_until = NULL, "
+                "settings = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status,
+                 json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 json.dumps(stats or {}, ensure_ascii=False),
+                 error, time.time(), job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
@@ -0,0 +1,52 @@
+import importlib
+import importlib.util
+import sys
+import threading
+
+# LazyLoader в Python 3.11 не потокобезопасен: пока один поток исполняет модуль,
+# другие видят его уже без атрибутов (AttributeError). Поэтому отложенные модули
+# загружаются целиком под блокировкой через load_lazy_modules() до первого
+# обращения из рабочих потоков.
+_load_lock = threading.RLock()
+_pending = []
+
+
+def lazy_import(name):
+    """Возвращает модуль, который реально загрузится при первом обращении к атрибуту.
+
+    Тяжёлые зависимости (cv2, pytesseract, pdf2image, requests, fitz) не нужны
+    при импорте app.py и перезапусках dev-сервера — только при обработке.
+    Код, который может работать в нескольких потоках, должен сначала вызвать
+    load_lazy_modules().
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        # Пусть ImportError всплывёт как при обычном импорте
+        return importlib.import_module(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    with _load_lock:
+        _pending.append(module)
+    return module
+
+
+def load_lazy_modules():
+    """Загружает все ещё не загруженные отложенные модули, один раз и под блокировкой.
+
+    Повторные вызовы почти бесплатны. Список очищается только после загрузки,
+    поэтому поток, увидевший пустой список, может сразу обращаться к модулям.
+    """
+    if not _pending:
+        return
+    with _load_lock:
+        for module in _pending:
+            # Любое обращение к атрибуту исполняет модуль
+            getattr(module, '__file__', None)
+        _pending.clear()
@@ -0,0 +1,180 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from file_processing_backend.lazy import lazy_import
+
+cv2 = lazy_import('cv2')
+
+# =========================================================
+# ДЕШЁВАЯ КЛАССИФИКАЦИЯ СТРАНИЦ ДО OCR
+# =========================================================
+# Пустые страницы: доля "чернил" на миниатюре (1/THUMB_SCALE) с фиксированным
+# порогом (Otsu на пустом листе "находит" текст в шуме) отбирает кандидатов,
+# а поиск компонент размером с букву в полном разрешении не даёт выбросить
+# страницу с одной строкой текста.
+#
+# Повторные страницы: текст между документами переиспользуется только для
+# побайтно совпавшего рендера (дайджест), иначе реквизиты одного клиента
+# могут попасть в документ другого. Внутри документа почти-копии (повторный
+# скан того же листа) подтверждаются сравнением в полном разрешении:
+# совмещение фазовой корреляцией, размытие и поиск пятен различий размером
+# с изменённую цифру. Пороги откалиброваны tools/check_page_filter.py на
+# uploads/ и синтетических счетах одного шаблона с разными ИНН.
+THUMB_SCALE = 4
+INK_THRESHOLD = 160          # темнее этого — чернила; просвет оборота обычно светлее
+BLANK_INK_RATIO = 0.002      # меньше 0.2% чернил — кандидат в пустые
+GLYPH_MIN_HEIGHT = 8         # при 300 dpi буква 6 pt выше 8 px, точки сканера ниже
+GLYPH_MAX_HEIGHT = 150
+GLYPH_MIN_AREA = 15
+MIN_TEXT_COMPONENTS = 3      # столько "букв" — уже текст, страница не пустая
+
+DUPLICATE_INK_TOLERANCE = 0.15   # кандидаты: доля чернил отличается не больше чем на 15%
+DUPLICATE_MAX_CANDIDATES = 3
+ALIGN_SCALE = 2                  # сдвиг ищется на половинном разрешении
+ALIGN_MIN_RESPONSE = 0.3         # у разных страниц отклик фазовой корреляции < 0.1
+DIFF_BLUR_SIGMA = 2.0            # гасит шум сканера, JPEG и субпиксельный сдвиг краёв
+DIFF_GREY_THRESHOLD = 40
+DIFF_MIN_AREA = 10               # у копий пятна до 5 px, у заменённой цифры от 20 px
+DIFF_MARGIN = 0.02               # края скана (тени, полосы) не сравниваем
+CACHE_SIZE = 256
+
+
+class PageSignature:
+    """Отпечаток страницы: доля чернил, число компонент-букв и дайджест рендера"""
+
+    __slots__ = ('ink_ratio', 'text_components', 'digest', 'shape')
+
+    def __init__(self, ink_ratio, text_components, digest, shape):
+        self.ink_ratio = ink_ratio
+        self.text_components = text_components
+        self.digest = digest
+        self.shape = shape
+
+    @property
+    def is_blank(self):
+        return self.ink_ratio < BLANK_INK_RATIO and self.text_components < MIN_TEXT_COMPONENTS
+
+    def is_candidate_for(self, other):
+        """Может ли страница быть копией other (проверка без пикселей)"""
+        if self.shape != other.shape:
+            return False
+        largest = max(self.ink_ratio, other.ink_ratio)
+        return abs(self.ink_ratio - other.ink_ratio) <= DUPLICATE_INK_TOLERANCE * largest
+
+
+def count_text_components(gray_img):
+    """Число связных компонент размером с букву на странице в полном разрешении"""
+    _, ink = cv2.threshold(gray_img, INK_THRESHOLD - 1, 255, cv2.THRESH_BINARY_INV)
+    count, _, components, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    heights = components[1:, cv2.CC_STAT_HEIGHT]
+    areas = components[1:, cv2.CC_STAT_AREA]
+    glyphs = (heights >= GLYPH_MIN_HEIGHT) & (heights <= GLYPH_MAX_HEIGHT) & (areas >= GLYPH_MIN_AREA)
+    return int(np.count_nonzero(glyphs))
+
+
+def page_signature(gray_img):
+    """Считает отпечаток по серому uint8-массиву страницы"""
+    h, w = gray_img.shape[:2]
+    thumb = cv2.resize(gray_img, (max(w // THUMB_SCALE, 1), max(h // THUMB_SCALE, 1)), interpolation=cv2.INTER_AREA)
+    thumb = cv2.medianBlur(thumb, 3)  # одиночные точки сканера не считаем чернилами
+    ink_ratio = float(np.count_nonzero(thumb < INK_THRESHOLD)) / thumb.size
+
+    # Компоненты считаем только у кандидатов в пустые: на обычной странице это лишняя работа
+    text_components = count_text_components(gray_img) if ink_ratio < BLANK_INK_RATIO else None
+    digest = hashlib.blake2b(np.ascontiguousarray(gray_img).data, digest_size=16).digest()
+    return PageSignature(ink_ratio, text_components, digest, gray_img.shape)
+
+
+def _align_shift(gray_a, gray_b):
+    """Сдвиг b относительно a в пикселях полного разрешения и отклик корреляции"""
+    h, w = gray_a.shape[:2]
+    size = (max(w // ALIGN_SCALE, 1), max(h // ALIGN_SCALE, 1))
+    small_a = cv2.resize(gray_a, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+    small_b = cv2.resize(gray_b, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+    (dx, dy), response = cv2.phaseCorrelate(small_a, small_b)
+    return dx * ALIGN_SCALE, dy * ALIGN_SCALE, response
+
+
+def difference_spots(gray_a, gray_b):
+    """Площадь самого крупного пятна различий после совмещения страниц (None — не совместились)"""
+    if gray_a.shape != gray_b.shape:
+        return None
+    dx, dy, response = _align_shift(gray_a, gray_b)
+    if response < ALIGN_MIN_RESPONSE:
+        return None
+
+    h, w = gray_a.shape[:2]
+    shift = np.float32([[1, 0, -dx], [0, 1, -dy]])
+    aligned_b = cv2.warpAffine(gray_b, shift, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    diff = cv2.absdiff(cv2.GaussianBlur(gray_a, (0, 0), DIFF_BLUR_SIGMA),
+                       cv2.GaussianBlur(aligned_b, (0, 0), DIFF_BLUR_SIGMA))
+
+    my, mx = int(h * DIFF_MARGIN), int(w * DIFF_MARGIN)
+    _, spots = cv2.threshold(diff[my:h - my, mx:w - mx], DIFF_GREY_THRESHOLD, 255, cv2.THRESH_BINARY)
+    count, _, components, _ = cv2.connectedComponentsWithStats(spots, connectivity=8)
+    return int(components[1:, cv2.CC_STAT_AREA].max()) if count > 1 else 0
+
+
+def pages_match(gray_a, gray_b):
+    """Одна и та же страница (повторный скан) — отличий размером с символ нет"""
+    largest = difference_spots(gray_a, gray_b)
+    return largest is not None and largest < DIFF_MIN_AREA
+
+
+class DocumentPageIndex:
+    """Распознанные страницы одного документа для поиска повторных сканов.
+
+    Хранит ссылки на массивы страниц: они не должны меняться, пока жив индекс
+    (extract_text_from_pdf и так держит все отрендеренные страницы, а страницы
+    из переиспользуемых буферов потока копирует).
+    """
+
+    def __init__(self):
+        self._pages = []
+
+    def lookup(self, signature, gray_img):
+        """Возвращает текст ранее распознанной копии страницы или None"""
+        candidates = [entry for entry in self._pages if signature.is_candidate_for(entry[0])]
+        candidates.sort(key=lambda entry: abs(entry[0].ink_ratio - signature.ink_ratio))
+        for _, page, text in candidates[:DUPLICATE_MAX_CANDIDATES]:
+            if pages_match(page, gray_img):
+                return text
+        return None
+
+    def add(self, signature, gray_img, text):
+        self._pages.append((signature, gray_img, text))
+
+
+class ExactPageCache:
+    """LRU-кэш OCR-текста по дайджесту рендера, общий для всех документов процесса"""
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, signature):
+        """Текст страницы с побайтно тем же рендером или None"""
+        key = (signature.shape, signature.digest)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def add(self, signature, text):
+        with self._lock:
+            self._entries[(signature.shape, signature.digest)] = text
+            self._entries.move_to_end((signature.shape, signature.digest))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+page_cache = ExactPageCache()
@@ -0,0 +1,153 @@
+import cProfile
+import ctypes
+import os
+import pstats
+import threading
+
+# Профилирование всех документов (например, при пакетной загрузке) без флага в запросе
+PROFILE_ENV_VAR = 'EXTRACTOR_PROFILE'
+# Замер пика кучи за документ — только для прогонов бенчмарка: mallinfo2 берёт
+# блокировку арены malloc и на фрагментированной куче может тормозить аллокации
+HEAP_STATS_ENV_VAR = 'EXTRACTOR_HEAP_STATS'
+HEAP_SAMPLE_INTERVAL = 0.05
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def profiling_enabled_by_env():
+    return _env_flag(PROFILE_ENV_VAR)
+
+
+def heap_stats_enabled_by_env():
+    return _env_flag(HEAP_STATS_ENV_VAR)
+
+
+def profile_path(pdf_path):
+    """Путь к .prof рядом с остальными отладочными файлами документа"""
+    return f"{os.path.splitext(pdf_path)[0]}_profile.prof"
+
+
+def profile_call(pdf_path, func, *args, **kwargs):
+    """Выполняет func под cProfile и сохраняет профиль рядом с документом"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # В одном процессе одновременно может работать только один профилировщик
+        print(f"[PROFILE] Профилирование пропущено: {e}")
+        return func(*args, **kwargs)
+
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        path = profile_path(pdf_path)
+        try:
+            profiler.dump_stats(path)
+            print(f"[DEBUG] Сохранен файл: {os.path.basename(path)}")
+        except OSError as e:
+            print(f"[DEBUG] Ошибка сохранения профиля: {e}")
+
+
+def summarize_profile(path, limit=20):
+    """Топ функций профиля по накопленному времени"""
+    stats = pstats.Stats(path)
+    rows = []
+    for (filename, line, function), (_, calls, own_time, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': function,
+            'file': os.path.basename(filename),
+            'line': line,
+            'calls': calls,
+            'own_seconds': round(own_time, 4),
+            'cumulative_seconds': round(cumulative, 4),
+        })
+    rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+    return {
+        'total_seconds': round(stats.total_tt, 4),
+        'functions': rows[:limit],
+    }
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in (
+        'arena', 'ordblks', 'smblks', 'hblks', 'hblkhd', 'usmblks', 'fsmblks', 'uordblks', 'fordblks', 'keepcost',
+    )]
+
+
+def _load_mallinfo2():
+    try:
+        mallinfo2 = ctypes.CDLL(None).mallinfo2
+    except (OSError, AttributeError, TypeError):
+        return None  # не glibc 2.33+ (Windows, macOS, musl)
+    mallinfo2.restype = _MallInfo2
+    return mallinfo2
+
+
+_mallinfo2 = _load_mallinfo2()
+
+
+def heap_in_use():
+    """Занятая куча процесса в байтах (malloc + mmap-блоки) или None вне glibc"""
+    if _mallinfo2 is None:
+        return None
+    info = _mallinfo2()
+    return info.uordblks + info.hblkhd
+
+
+class HeapWatch:
+    """Пиковый прирост занятой кучи за время обработки документа.
+
+    Фоновый поток опрашивает mallinfo2 каждые HEAP_SAMPLE_INTERVAL секунд.
+    В отличие от ru_maxrss освобождённая память вычитается, поэтому пик у
+    каждого документа свой; в отличие от tracemalloc видны и буферы PIL и
+    OpenCV. Tesseract — отдельный процесс и сюда не входит. Документы,
+    которые параллельно обрабатываются в том же процессе, видят кучу друг
+    друга: для сравнения прогонов обрабатывайте с EXTRACTOR_WORKERS=1.
+    При enabled=False ничего не замеряется и peak_mb() возвращает None.
+    """
+
+    def __init__(self, interval=HEAP_SAMPLE_INTERVAL, enabled=True):
+        self.interval = interval
+        self.enabled = enabled
+        self.start = self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        current = heap_in_use()
+        if current > self.peak:
+            self.peak = current
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def peak_mb(self):
+        """Пик над уровнем начала замера в МиБ (None, если куча не измеряется)"""
+        if self.start is None:
+            return None
+        self._sample()
+        return round((self.peak - self.start) / 2**20, 1)
+
+    def record(self, stats, key):
+        """Пишет текущий пик в stats[key], если куча замеряется"""
+        peak = self.peak_mb()
+        if peak is not None:
+            stats[key] = peak
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self.start = self.peak = heap_in_use()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._run, name='heap-watch', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
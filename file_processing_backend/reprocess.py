@@ -0,0 +1,108 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_processing_backend.text_extractor import process_text_with_neural_network
+
+# =========================================================
+# ПОВТОРНЫЙ ПРОГОН ТОЛЬКО LLM ПО СОХРАНЁННОМУ OCR
+# =========================================================
+# OCR-текст каждого документа уже лежит в <имя>_raw_ocr.txt. Для новой версии
+# промта/модели он сразу уходит в нейросеть, а результат пишется в
+# <имя>_result_<версия>.json, не трогая исходный _result.json.
+RAW_OCR_SUFFIX = '_raw_ocr.txt'
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+# Версия попадает в имена файлов: только буквы, цифры, '_', '.' и '-'
+VERSION_PATTERN = re.compile(r'[\w.-]+')
+# Секреты не пишутся в снимок настроек в uploads/ и не влияют на версию
+SECRET_SETTINGS = ('apiKey',)
+
+
+def public_settings(settings):
+    """Настройки без секретов"""
+    return {key: value for key, value in settings.items() if key not in SECRET_SETTINGS}
+
+
+def settings_version(settings):
+    """Короткий стабильный идентификатор набора настроек"""
+    blob = json.dumps(public_settings(settings), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:10]
+
+
+def validate_version(version):
+    """Проверяет метку версии из запроса; бросает ValueError, если она не годится в имя файла"""
+    if not isinstance(version, str) or not VERSION_PATTERN.fullmatch(version) or not version.strip('.'):
+        raise ValueError(f"Недопустимая версия {version!r}: разрешены буквы, цифры, '_', '.' и '-'")
+    return version
+
+
+def validate_concurrency(concurrency):
+    """Проверяет число параллельных запросов к LLM; бросает ValueError вне 1..MAX_CONCURRENCY"""
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or not 1 <= concurrency <= MAX_CONCURRENCY:
+        raise ValueError(f"Недопустимая параллельность {concurrency!r}: нужно целое от 1 до {MAX_CONCURRENCY}")
+    return concurrency
+
+
+def find_documents(uploads_dir, names=None):
+    """Имена (без расширения) документов, для которых сохранён OCR-текст"""
+    if names:
+        stems = [os.path.splitext(os.path.basename(name))[0] for name in names]
+    else:
+        pattern = os.path.join(uploads_dir, f"*{RAW_OCR_SUFFIX}")
+        stems = [os.path.basename(path)[:-len(RAW_OCR_SUFFIX)] for path in glob.glob(pattern)]
+    return sorted(set(stems))
+
+
+def result_path(uploads_dir, stem, version):
+    return os.path.join(uploads_dir, f"{stem}_result_{version}.json")
+
+
+def reprocess_document(uploads_dir, stem, settings, version):
+    """Прогоняет сохранённый OCR одного документа через LLM с новыми настройками"""
+    ocr_path = os.path.join(uploads_dir, f"{stem}{RAW_OCR_SUFFIX}")
+    if not os.path.exists(ocr_path):
+        return {'document': stem, 'status': 'error', 'error': 'Нет сохранённого OCR (_raw_ocr.txt)'}
+
+    with open(ocr_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    # Отладочные файлы версии ложатся рядом как <имя>_<версия>_final_prompt_sent.txt и т.д.
+    debug_base = os.path.join(uploads_dir, f"{stem}_{version}.pdf")
+    started = time.perf_counter()
+    result = process_text_with_neural_network(text, settings, pdf_path_for_debug=debug_base)
+    seconds = round(time.perf_counter() - started, 3)
+
+    path = result_path(uploads_dir, stem, version)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+
+    status = 'error' if isinstance(result, dict) and 'error' in result else 'success'
+    return {'document': stem, 'status': status, 'result_file': os.path.basename(path), 'llm_seconds': seconds}
+
+
+def reprocess_documents(uploads_dir, settings, names=None, version=None, concurrency=DEFAULT_CONCURRENCY):
+    """Перепрогоняет набор документов и возвращает сводку по версии"""
+    version = validate_version(version) if version else settings_version(settings)
+    concurrency = validate_concurrency(concurrency)
+    stems = find_documents(uploads_dir, names)
+
+    # Снимок настроек, чтобы версию результатов можно было воспроизвести (ключ API не сохраняем)
+    with open(os.path.join(uploads_dir, f"reprocess_{version}_settings.json"), 'w', encoding='utf-8') as f:
+        json.dump(public_settings(settings), f, ensure_ascii=False, indent=4)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        documents = list(pool.map(lambda stem: reprocess_document(uploads_dir, stem, settings, version), stems))
+
+    return {
+        'version': version,
+        'total': len(documents),
+        'succeeded': sum(1 for doc in documents if doc['status'] == 'success'),
+        'seconds': round(time.perf_counter() - started, 3),
+        'documents': documents,
+    }
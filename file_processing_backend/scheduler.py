@@ -0,0 +1,207 @@
+import glob
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from file_processing_backend.lazy import lazy_import, load_lazy_modules
+from file_processing_backend.text_extractor import RENDER_DPI
+
+fitz = lazy_import('fitz')  # PyMuPDF
+
+# Коэффициенты по умолчанию, пока нет истории: секунды = a + b*страницы + c*мегапиксели
+DEFAULT_COEFFICIENTS = (5.0, 2.0, 1.0)
+MIN_HISTORY_SAMPLES = 5
+MAX_HISTORY_SAMPLES = 2000
+
+
+def document_features(pdf_path):
+    """Читает число страниц и суммарную площадь рендера из PDF без растеризации"""
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count
+        megapixels = 0.0
+        for page in doc:
+            rect = page.rect
+            megapixels += (rect.width / 72.0 * RENDER_DPI) * (rect.height / 72.0 * RENDER_DPI) / 1e6
+    return pages, round(megapixels, 3)
+
+
+class CostModel:
+    """Линейная модель времени обработки документа по страницам и разрешению"""
+
+    def __init__(self, samples=None):
+        self._lock = threading.Lock()
+        self._samples = list(samples or [])[-MAX_HISTORY_SAMPLES:]
+        self.coefficients = DEFAULT_COEFFICIENTS
+        self._fit()
+
+    @classmethod
+    def from_history(cls, uploads_dir):
+        """Строит модель по сохранённым _stats.json обработанных документов"""
+        samples = []
+        for stats_path in glob.glob(os.path.join(uploads_dir, '*_stats.json')):
+            try:
+                with open(stats_path, 'r', encoding='utf-8') as f:
+                    stats = json.load(f)
+                samples.append((stats['pages'], stats['megapixels'], stats['total_seconds']))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return cls(samples)
+
+    def _fit(self):
+        if len(self._samples) < MIN_HISTORY_SAMPLES:
+            return
+        data = np.asarray(self._samples, dtype=np.float64)
+        features = np.column_stack([np.ones(len(data)), data[:, 0], data[:, 1]])
+        coefficients, *_ = np.linalg.lstsq(features, data[:, 2], rcond=None)
+        # Отрицательные веса на малой выборке дают бессмысленные прогнозы
+        if np.all(coefficients[1:] >= 0):
+            self.coefficients = tuple(float(c) for c in coefficients)
+
+    def predict(self, pages, megapixels):
+        a, b, c = self.coefficients
+        return max(a + b * pages + c * megapixels, 0.1)
+
+    def predict_document(self, pdf_path):
+        """Признаки документа и прогноз его стоимости в секундах"""
+        load_lazy_modules()  # вызывается из потоков запросов
+        try:
+            features = document_features(pdf_path)
+        except Exception as e:
+            print(f"[SCHEDULER] Не удалось прочитать {os.path.basename(pdf_path)}: {e}")
+            features = (1, 0.0)
+        return features, self.predict(*features)
+
+    def observe(self, pages, megapixels, seconds):
+        with self._lock:
+            self._samples.append((pages, megapixels, seconds))
+            del self._samples[:-MAX_HISTORY_SAMPLES]
+            self._fit()
+
+
+class SchedulerBusy(Exception):
+    """Очередь переполнена: прогнозируемый бэклог превышает лимит"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Очередь переполнена, повторите через {retry_after} с")
+        self.retry_after = retry_after
+
+
+def admission_retry_after(backlog_seconds, predicted_seconds, workers, max_backlog_seconds):
+    """Через сколько секунд повторить постановку задачи или None, если её можно принять.
+
+    Лимит сравнивается с ожиданием в очереди: бэклог делится на число воркеров.
+    Пустую очередь не блокируем, даже если один документ дороже лимита.
+    """
+    wait_seconds = (backlog_seconds + predicted_seconds) / max(workers, 1)
+    if not backlog_seconds or wait_seconds <= max_backlog_seconds:
+        return None
+    return max(math.ceil(wait_seconds - max_backlog_seconds), 1)
+
+
+class Job:
+    def __init__(self, func, args, kwargs, features, predicted_seconds):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.features = features
+        self.predicted_seconds = predicted_seconds
+        self.enqueued_at = time.monotonic()
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Блокирует вызывающий поток до завершения задачи и возвращает результат"""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class JobScheduler:
+    """Очередь "сначала самые короткие" со старением и контролем допуска.
+
+    Приоритет задачи = прогноз - aging_rate * время_ожидания. Все задачи стареют
+    с одной скоростью, поэтому общий член -aging_rate * now можно отбросить и
+    хранить в куче постоянный ключ прогноз + aging_rate * момент_постановки.
+    """
+
+    def __init__(self, cost_model, workers=1, max_backlog_seconds=900.0, aging_rate=1.0, worker_init=None):
+        self.cost_model = cost_model
+        self.worker_init = worker_init
+        self.workers = max(int(workers), 1)
+        self.max_backlog_seconds = max_backlog_seconds
+        self.aging_rate = aging_rate
+        self._heap = []
+        self._counter = itertools.count()
+        self._backlog_seconds = 0.0
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        """Запускает воркеры заранее, чтобы прогрев прошёл до первого запроса"""
+        load_lazy_modules()
+        with self._cond:
+            self._ensure_workers()
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker_loop, name=f"doc-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def backlog_seconds(self):
+        with self._cond:
+            return self._backlog_seconds
+
+    def submit(self, pdf_path, func, *args, **kwargs):
+        """Ставит обработку pdf_path в очередь; бросает SchedulerBusy при перегрузке"""
+        features, predicted = self.cost_model.predict_document(pdf_path)
+
+        with self._cond:
+            retry_after = admission_retry_after(self._backlog_seconds, predicted, self.workers,
+                                                self.max_backlog_seconds)
+            if retry_after is not None:
+                raise SchedulerBusy(retry_after)
+
+            job = Job(func, args, kwargs, features, predicted)
+            key = predicted + self.aging_rate * job.enqueued_at
+            heapq.heappush(self._heap, (key, next(self._counter), job))
+            self._backlog_seconds += predicted
+            self._ensure_workers()
+            self._cond.notify()
+
+        print(f"[SCHEDULER] {os.path.basename(pdf_path)}: {features[0]} стр., прогноз {predicted:.1f} с")
+        return job
+
+    def _worker_loop(self):
+        if self.worker_init is not None:
+            try:
+                self.worker_init()
+            except Exception as e:
+                print(f"[SCHEDULER] Ошибка прогрева воркера: {e}")
+
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+
+            started = time.perf_counter()
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                job.error = e
+            elapsed = time.perf_counter() - started
+
+            with self._cond:
+                self._backlog_seconds = max(self._backlog_seconds - job.predicted_seconds, 0.0)
+            if job.error is None:
+                self.cost_model.observe(job.features[0], job.features[1], elapsed)
+            job._done.set()
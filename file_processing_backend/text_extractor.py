@@ -1,19 +1,26 @@
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
 import os
-import requests
-from pdf2image import convert_from_path
 import json
 import tempfile
 import re
-import cv2
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+from file_processing_backend.lazy import lazy_import, load_lazy_modules
+from file_processing_backend.page_filter import DocumentPageIndex, page_cache, page_signature
+from file_processing_backend.profiling import HeapWatch, heap_stats_enabled_by_env, profile_call, profiling_enabled_by_env
+
+# Тяжёлые модули грузятся при первом использовании (см. warm_up)
+cv2 = lazy_import('cv2')
+pdf2image = lazy_import('pdf2image')
+pytesseract = lazy_import('pytesseract')
+requests = lazy_import('requests')
+
 # =========================================================
 # КОНФИГУРАЦИЯ СИСТЕМНЫХ ПУТЕЙ
 # =========================================================
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 POPLER_PATH = r'C:\Program Files\poppler-24.08.0\Library\bin'
 
 # Конфигурация Tesseract
@@ -22,6 +29,7 @@ TESSERACT_CONFIGS = [
     r'--oem 3 --psm 4'
 ]
 LANGUAGES = 'rus+eng'
+RENDER_DPI = 300
 
 DEFAULT_GENERATION_PARAMS = {
     "max_context_length": 2048,
@@ -107,30 +115,164 @@ def save_debug_file(original_path, suffix, content, mode='w'):
     except Exception as e:
         print(f"[DEBUG] Ошибка сохранения {suffix}: {e}")
 
+def save_result_file(pdf_path, result):
+    """Сохраняет итоговый JSON документа как <имя>_result.json"""
+    result_path = f"{os.path.splitext(pdf_path)[0]}_result.json"
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    return result_path
+
+def run_document_job(pdf_path, settings=None, stats=None, profile=False):
+    """Обработка документа планировщиком в процессе приложения: результат сразу ложится на диск.
+
+    Воркеры общей очереди (worker.py) сохраняют результат сами, только после complete().
+    """
+    result = process_document(pdf_path, settings, stats=stats, profile=profile)
+    if result:
+        save_result_file(pdf_path, result)
+    return result
+
+class PageBuffers:
+    """Переиспользуемые uint8-буферы предобработки (по одному набору на воркер)"""
+
+    def __init__(self):
+        self._arrays = {}
+        self._clahe = None
+
+    def get(self, name, shape):
+        """Возвращает буфер нужной формы, выделяя память только при смене размера"""
+        array = self._arrays.get(name)
+        if array is None or array.shape != shape:
+            array = np.empty(shape, dtype=np.uint8)
+            self._arrays[name] = array
+        return array
+
+    def owns(self, array):
+        """Лежит ли массив в одном из буферов (перезапишется на следующей странице)"""
+        return any(np.may_share_memory(array, buffer) for buffer in self._arrays.values())
+
+    @property
+    def clahe(self):
+        if self._clahe is None:
+            self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        return self._clahe
+
+
+_worker_state = threading.local()
+
+
+def get_page_buffers():
+    """Буферы текущего потока-воркера"""
+    buffers = getattr(_worker_state, 'buffers', None)
+    if buffers is None:
+        buffers = PageBuffers()
+        _worker_state.buffers = buffers
+    return buffers
+
+
+def page_to_gray(page, buffers=None):
+    """Приводит страницу (PIL или ndarray) к серому uint8-массиву без лишних копий"""
+    if isinstance(page, np.ndarray):
+        np_img = page
+    else:
+        if page.mode not in ('L', 'RGB', 'RGBA'):
+            page = page.convert('RGB')
+        np_img = np.asarray(page)
+
+    if np_img.ndim == 2:
+        return np_img
+
+    buffers = buffers or get_page_buffers()
+    gray = buffers.get('gray', np_img.shape[:2])
+    code = cv2.COLOR_RGBA2GRAY if np_img.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+    return cv2.cvtColor(np_img, code, dst=gray)
+
+
+# =========================================================
+# ПОЛОСНАЯ (TILED) ОБРАБОТКА ОДНОЙ СТРАНИЦЫ
+# =========================================================
+# Страница режется на горизонтальные полосы с перекрытием TILE_HALO строк,
+# полосы обрабатываются в пуле потоков (OpenCV отпускает GIL), центральные
+# части склеиваются обратно. Перекрытие больше радиуса любого фильтра
+# (NLMeans: 10 + 3, adaptiveThreshold: 10, medianBlur: 1), поэтому швов нет.
+TILE_WORKERS = min(os.cpu_count() or 1, 8)
+TILE_HALO = 16
+TILED_MIN_PIXELS = 2_000_000  # на маленьких картинках накладные расходы пула не окупаются
+
+_tile_pool = None
+_tile_pool_lock = threading.Lock()
+
+
+def _get_tile_pool():
+    global _tile_pool
+    with _tile_pool_lock:
+        if _tile_pool is None:
+            _tile_pool = ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix='tile')
+        return _tile_pool
+
+
+def run_tiled(src, dst, func, tiles, halo=TILE_HALO):
+    """Применяет func(полоса) -> массив к src по полосам и пишет результат в dst"""
+    height = src.shape[0]
+    bounds = np.linspace(0, height, tiles + 1).astype(int)
+
+    def process_strip(index):
+        top, bottom = bounds[index], bounds[index + 1]
+        padded_top = max(top - halo, 0)
+        padded_bottom = min(bottom + halo, height)
+        out = func(src[padded_top:padded_bottom])
+        offset = top - padded_top
+        dst[top:bottom] = out[offset:offset + (bottom - top)]
+
+    list(_get_tile_pool().map(process_strip, range(tiles)))
+    return dst
+
+
+def _denoise_strip(strip):
+    return cv2.fastNlMeansDenoising(strip, None, h=15, templateWindowSize=7, searchWindowSize=21)
+
+
+def _binarize_strip(strip):
+    binary = cv2.adaptiveThreshold(strip, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 10)
+    return cv2.medianBlur(binary, 3, dst=binary)
+
+
 class ImageProcessor:
     """Класс для улучшения качества сканов перед OCR"""
-    
+
     @staticmethod
-    def _scale_for_ocr(gray_img):
+    def _scaled_size(gray_img):
         max_side = 2200
         h, w = gray_img.shape[:2]
         longest = max(h, w)
         if longest >= max_side:
-            return gray_img
+            return None
         scale = min(max_side / float(longest), 2.5)
-        return cv2.resize(gray_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        return int(round(w * scale)), int(round(h * scale))
+
+    @staticmethod
+    def _scale_for_ocr(gray_img, buffers=None):
+        size = ImageProcessor._scaled_size(gray_img)
+        if size is None:
+            return gray_img
+        buffers = buffers or get_page_buffers()
+        scaled = buffers.get('scaled', (size[1], size[0]))
+        return cv2.resize(gray_img, size, dst=scaled, interpolation=cv2.INTER_CUBIC)
 
     @staticmethod
-    def _prepare_binary(gray_img):
+    def _prepare_binary(gray_img, buffers=None):
         """Готовит инвертированное двоичное изображение для поиска наклона"""
-        blur = cv2.GaussianBlur(gray_img, (5, 5), 0)
-        _, thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        return cv2.bitwise_not(thresh)
+        buffers = buffers or get_page_buffers()
+        binary = buffers.get('binary', gray_img.shape[:2])
+        cv2.GaussianBlur(gray_img, (5, 5), 0, dst=binary)
+        cv2.threshold(binary, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=binary)
+        return cv2.bitwise_not(binary, dst=binary)
 
     @staticmethod
-    def _estimate_angle_hough(binary_img):
+    def _estimate_angle_hough(binary_img, edges=None):
         height, width = binary_img.shape[:2]
-        edges = cv2.Canny(binary_img, 50, 150, apertureSize=3)
+        if edges is None:
+            edges = cv2.Canny(binary_img, 50, 150, apertureSize=3)
         vote_threshold = max(int(0.03 * min(height, width)), 100)
         lines = cv2.HoughLines(edges, 1, np.pi / 1800, vote_threshold)
 
@@ -150,9 +292,10 @@ class ImageProcessor:
         return float(np.median(angles))
 
     @staticmethod
-    def _estimate_angle_probabilistic(binary_img):
+    def _estimate_angle_probabilistic(binary_img, edges=None):
         height, width = binary_img.shape[:2]
-        edges = cv2.Canny(binary_img, 50, 150, apertureSize=3)
+        if edges is None:
+            edges = cv2.Canny(binary_img, 50, 150, apertureSize=3)
         min_line_length = max(int(width * 0.35), 150)
         lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=120,
                                 minLineLength=min_line_length, maxLineGap=20)
@@ -196,17 +339,20 @@ class ImageProcessor:
         return None
 
     @staticmethod
-    def _estimate_skew_angle(gray_img):
+    def _estimate_skew_angle(gray_img, buffers=None):
         """Комплексно оценивает угол наклона через разные детекторы"""
-        binary = ImageProcessor._prepare_binary(gray_img)
+        buffers = buffers or get_page_buffers()
+        binary = ImageProcessor._prepare_binary(gray_img, buffers)
+        # Границы нужны обоим детекторам Хафа — считаем их один раз
+        edges = cv2.Canny(binary, 50, 150, edges=buffers.get('edges', binary.shape[:2]), apertureSize=3)
 
         angles = []
-        for detector in (
-            ImageProcessor._estimate_angle_hough,
-            ImageProcessor._estimate_angle_probabilistic,
-            ImageProcessor._estimate_angle_components,
+        for detector, kwargs in (
+            (ImageProcessor._estimate_angle_hough, {'edges': edges}),
+            (ImageProcessor._estimate_angle_probabilistic, {'edges': edges}),
+            (ImageProcessor._estimate_angle_components, {}),
         ):
-            angle = detector(binary)
+            angle = detector(binary, **kwargs)
             if angle is not None:
                 angles.append(angle)
 
@@ -221,62 +367,70 @@ class ImageProcessor:
         return median
 
     @staticmethod
-    def deskew_image(pil_image):
-        """Выравнивает наклон и возвращает угол"""
+    def deskew_image(page, buffers=None):
+        """Выравнивает наклон серой страницы и возвращает (массив, угол)"""
+        buffers = buffers or get_page_buffers()
+        gray = page_to_gray(page, buffers)
         try:
-            np_img = np.array(pil_image)
-            if np_img.ndim == 2:
-                gray = np_img
-            else:
-                if np_img.shape[2] == 4:
-                    gray = cv2.cvtColor(np_img, cv2.COLOR_RGBA2GRAY)
-                else:
-                    gray = cv2.cvtColor(np_img, cv2.COLOR_RGB2GRAY)
-
-            angle = ImageProcessor._estimate_skew_angle(gray)
+            angle = ImageProcessor._estimate_skew_angle(gray, buffers)
 
             if abs(angle) < 0.1 or abs(angle) > 30:
-                return pil_image.copy(), angle
+                return gray, angle
 
             (h, w) = gray.shape[:2]
             center = (w // 2, h // 2)
             M = cv2.getRotationMatrix2D(center, angle, 1.0)
-            rotated = cv2.warpAffine(np_img, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-            return Image.fromarray(rotated), angle
+            rotated = buffers.get('rotated', (h, w))
+            cv2.warpAffine(gray, M, (w, h), dst=rotated, flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+            return rotated, angle
         except Exception:
-            return pil_image.copy(), None
+            return gray, None
 
     @staticmethod
-    def enhance_quality(pil_image, debug_save_path=None):
-        """Улучшает резкость и контраст + сохраняет дебаг картинку"""
-        # 1. Выравнивание
-        image, detected_angle = ImageProcessor.deskew_image(pil_image)
-        
-        # 2. Конвертация в массив
-        img_np = np.array(image)
-        if len(img_np.shape) == 3:
-            img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-
-        # 3. Нормализация размера и шумоподавление
-        img_np = ImageProcessor._scale_for_ocr(img_np)
-        img_np = cv2.fastNlMeansDenoising(img_np, None, h=15, templateWindowSize=7, searchWindowSize=21)
-
-        # 4. Повышение контраста и локальная нормализация
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        img_np = clahe.apply(img_np)
-
-        # 5. Бинаризация и зачистка артефактов
-        processed = cv2.adaptiveThreshold(
-            img_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 10
-        )
-        processed = cv2.medianBlur(processed, 3)
-        
-        result_img = Image.fromarray(processed)
-        
+    def enhance_quality(page, debug_save_path=None, buffers=None, tiles=None):
+        """Улучшает резкость и контраст + сохраняет дебаг картинку.
+
+        Возвращает uint8-массив, который живёт в буферах воркера и остаётся
+        валидным до следующего вызова в этом же потоке. tiles задаёт число
+        полос для параллельной обработки (по умолчанию TILE_WORKERS, 1 — без полос).
+        """
+        buffers = buffers or get_page_buffers()
+
+        # 1. Выравнивание (сразу в сером виде)
+        img_np, detected_angle = ImageProcessor.deskew_image(page, buffers)
+
+        # 2. Нормализация размера и шумоподавление
+        img_np = ImageProcessor._scale_for_ocr(img_np, buffers)
+        shape = img_np.shape[:2]
+        work_a = buffers.get('work_a', shape)
+        work_b = buffers.get('work_b', shape)
+        if tiles is None:
+            tiles = TILE_WORKERS
+        tiled = tiles > 1 and shape[0] * shape[1] >= TILED_MIN_PIXELS
+
+        if tiled:
+            run_tiled(img_np, work_a, _denoise_strip, tiles)
+        else:
+            cv2.fastNlMeansDenoising(img_np, work_a, h=15, templateWindowSize=7, searchWindowSize=21)
+
+        # 3. Повышение контраста и локальная нормализация.
+        # CLAHE строит гистограммы по сетке 8x8 на весь кадр — полосы сдвинули бы
+        # сетку, поэтому он всегда идёт целиком (и стоит дёшево)
+        buffers.clahe.apply(work_a, work_b)
+
+        # 4. Бинаризация и зачистка артефактов (буферы чередуются: a -> b -> a -> b)
+        if tiled:
+            processed = run_tiled(work_b, work_a, _binarize_strip, tiles)
+        else:
+            cv2.adaptiveThreshold(
+                work_b, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 10, dst=work_a
+            )
+            processed = cv2.medianBlur(work_a, 3, dst=work_b)
+
         # Сохраняем первую страницу, чтобы юзер видел, что видит робот
         if debug_save_path:
             try:
-                result_img.save(debug_save_path)
+                cv2.imwrite(debug_save_path, processed)
                 print(f"[DEBUG] Сохранена обработанная картинка: {debug_save_path}")
             except Exception as e:
                 print(f"Ошибка сохранения дебаг-картинки: {e}")
@@ -289,7 +443,7 @@ class ImageProcessor:
                 except Exception as angle_err:
                     print(f"Ошибка сохранения угла наклона: {angle_err}")
 
-        return result_img
+        return processed
 
 def get_regex_hints(text):
     """Ищет в тексте все числа, похожие на ИНН и КПП."""
@@ -308,14 +462,22 @@ def _ocr_text_score(text):
     return len(cleaned)
 
 
+def _tesseract():
+    """pytesseract с настроенным путём к бинарнику (настройка откладывается до первого OCR)"""
+    if pytesseract.pytesseract.tesseract_cmd != TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
+
 def run_multi_pass_ocr(processed_img, original_img):
+    """Прогоняет Tesseract по обработанной и исходной странице (uint8-массивы)"""
     candidates = []
-    for pil_image in (processed_img, original_img):
-        if pil_image is None:
+    for page_img in (processed_img, original_img):
+        if page_img is None:
             continue
         for config in TESSERACT_CONFIGS:
             try:
-                text = pytesseract.image_to_string(pil_image, lang=LANGUAGES, config=config)
+                text = _tesseract().image_to_string(page_img, lang=LANGUAGES, config=config)
                 candidates.append(text)
             except pytesseract.TesseractError as e:
                 print(f"[WARNING] OCR fail for config {config}: {e}")
@@ -326,34 +488,96 @@ def run_multi_pass_ocr(processed_img, original_img):
     candidates.sort(key=_ocr_text_score, reverse=True)
     return candidates[0]
 
-def extract_text_from_pdf(pdf_path):
-    """Извлекает текст из PDF и сохраняет логи"""
+def warm_up():
+    """Прогревает текущий поток-воркер до первого документа.
+
+    Загружает отложенные модули, инициализирует OpenCV и буферы потока на
+    крошечной синтетической странице и один раз запускает Tesseract, чтобы
+    бинарник и traineddata оказались в кэше ОС.
+    """
+    started = time.perf_counter()
+    load_lazy_modules()
+
+    page = np.full((120, 480), 255, dtype=np.uint8)
+    cv2.putText(page, 'INN 7701234567', (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+    processed = ImageProcessor.enhance_quality(page)
+    try:
+        run_multi_pass_ocr(processed, None)
+    except Exception as e:
+        print(f"[WARMUP] Tesseract недоступен: {e}")
+
+    elapsed = time.perf_counter() - started
+    print(f"[WARMUP] {threading.current_thread().name} прогрет за {elapsed:.2f} с")
+    return elapsed
+
+def extract_text_from_pdf(pdf_path, stats=None):
+    """Извлекает текст из PDF и сохраняет логи.
+
+    Если передан словарь stats, в него пишутся счётчики страниц: сколько
+    распознано, сколько пропущено как пустые и сколько взято из кэша дубликатов.
+    """
+    if stats is None:
+        stats = {}
+    stats.update({'pages': 0, 'ocr_pages': 0, 'blank_pages_skipped': 0, 'duplicate_pages_reused': 0})
+    started = time.perf_counter()
     try:
         print(f"--- Начало OCR для: {os.path.basename(pdf_path)} ---")
         
         with tempfile.TemporaryDirectory() as temp_dir:
-            images = convert_from_path(pdf_path, poppler_path=POPLER_PATH, dpi=300)
+            # Рендерим сразу в оттенках серого: цвет для OCR не нужен, а память втрое меньше
+            images = pdf2image.convert_from_path(pdf_path, poppler_path=POPLER_PATH, dpi=RENDER_DPI, grayscale=True)
             full_text = []
+            page_index = DocumentPageIndex()
+            stats['pages'] = len(images)
+            stats['megapixels'] = round(sum(img.width * img.height for img in images) / 1e6, 3)
 
             for i, image in enumerate(images):
                 print(f"Обработка страницы {i+1}...")
+                page = page_to_gray(image)
+
+                # Дешёвый фильтр до OCR: пустые листы и повторные копии страниц
+                signature = page_signature(page)
+                if signature.is_blank:
+                    print(f"Страница {i+1} пустая (чернил {signature.ink_ratio:.4f}, "
+                          f"похожих на буквы пятен {signature.text_components}), OCR пропущен")
+                    stats['blank_pages_skipped'] += 1
+                    full_text.append(f"--- СТРАНИЦА {i+1} ---\n")
+                    continue
+
+                # Между документами — только тот же рендер, внутри документа — и повторный скан
+                cached_text = page_cache.lookup(signature)
+                if cached_text is None:
+                    cached_text = page_index.lookup(signature, page)
+                if cached_text is not None:
+                    print(f"Страница {i+1} совпадает с уже распознанной, текст взят из кэша")
+                    stats['duplicate_pages_reused'] += 1
+                    full_text.append(f"--- СТРАНИЦА {i+1} ---\n{cached_text}")
+                    continue
                 
                 # Формируем путь для сохранения дебаг-картинки (только для 1 страницы)
                 debug_img_path = None
                 if i == 0: 
                     debug_img_path = f"{os.path.splitext(pdf_path)[0]}_debug_processed_view.jpg"
 
-                # Обработка картинки
-                processed_img = ImageProcessor.enhance_quality(image, debug_img_path)
+                # Обработка картинки: дальше работаем только с numpy-массивами
+                processed_img = ImageProcessor.enhance_quality(page, debug_img_path)
                 
                 # Tesseract: пробуем несколько конфигураций и выбираем лучшую
-                text = run_multi_pass_ocr(processed_img, image)
+                text = run_multi_pass_ocr(processed_img, page)
+                stats['ocr_pages'] += 1
+                page_cache.add(signature, text)
+                # Индекс держит страницу до конца документа; цветной рендер приводится
+                # к серому в общий буфер потока, и без копии совпал бы сам с собой
+                if get_page_buffers().owns(page):
+                    page = page.copy()
+                page_index.add(signature, page, text)
                 full_text.append(f"--- СТРАНИЦА {i+1} ---\n{text}")
 
             combined_text = "\n".join(full_text)
             
             # === ГЛАВНОЕ: СОХРАНЯЕМ ТЕКСТ В ФАЙЛ ===
             save_debug_file(pdf_path, "raw_ocr.txt", combined_text)
+            stats['ocr_seconds'] = round(time.perf_counter() - started, 3)
             
             if not combined_text.strip():
                 print("[WARNING] Tesseract вернул пустой текст! Проверьте debug_processed_view.jpg")
@@ -423,17 +647,43 @@ def process_text_with_neural_network(text, settings, pdf_path_for_debug=""):
             save_debug_file(pdf_path_for_debug, "crash_log.txt", str(e))
         return {"error": "Processing failed", "details": str(e)}
 
-def process_document(pdf_path, settings=None):
-    """Точка входа"""
-    text = extract_text_from_pdf(pdf_path)
-    
-    # Если текст пустой, нет смысла слать в LLM
-    if not text or len(text.strip()) < 10:
-        return {"error": "OCR не смог прочитать текст. Проверьте _raw_ocr.txt и _debug.jpg"}
-    
-    if not settings:
-        settings = {'prompt': '{text}'} 
-
-    # Передаем путь к файлу, чтобы функции могли сохранять логи рядом
-    result = process_text_with_neural_network(text, settings, pdf_path_for_debug=pdf_path)
+def process_document(pdf_path, settings=None, stats=None, profile=False):
+    """Точка входа. В stats (если передан) попадает статистика обработки документа.
+
+    При profile=True (или переменной окружения EXTRACTOR_PROFILE=1) весь вызов
+    профилируется cProfile, профиль сохраняется в <имя>_profile.prof.
+    """
+    load_lazy_modules()  # документы обрабатываются параллельно (планировщик, reprocess)
+    if profile or profiling_enabled_by_env():
+        return profile_call(pdf_path, _process_document, pdf_path, settings, stats)
+    return _process_document(pdf_path, settings, stats)
+
+def _process_document(pdf_path, settings=None, stats=None):
+    if stats is None:
+        stats = {}
+    started = time.perf_counter()
+    # Память — пиковый прирост кучи за документ, а не монотонный пик RSS процесса.
+    # Замеряется только в прогонах бенчмарка (EXTRACTOR_HEAP_STATS=1)
+    with HeapWatch(enabled=heap_stats_enabled_by_env()) as heap:
+        text = extract_text_from_pdf(pdf_path, stats=stats)
+        heap.record(stats, 'ocr_heap_peak_mb')
+        
+        # Если текст пустой, нет смысла слать в LLM
+        if not text or len(text.strip()) < 10:
+            stats['total_seconds'] = round(time.perf_counter() - started, 3)
+            save_debug_file(pdf_path, "stats.json", json.dumps(stats, ensure_ascii=False, indent=4))
+            return {"error": "OCR не смог прочитать текст. Проверьте _raw_ocr.txt и _debug.jpg"}
+        
+        if not settings:
+            settings = {'prompt': '{text}'} 
+
+        # Передаем путь к файлу, чтобы функции могли сохранять логи рядом
+        llm_started = time.perf_counter()
+        result = process_text_with_neural_network(text, settings, pdf_path_for_debug=pdf_path)
+        stats['llm_seconds'] = round(time.perf_counter() - llm_started, 3)
+        stats['total_seconds'] = round(time.perf_counter() - started, 3)
+        heap.record(stats, 'heap_peak_mb')
+
+    # Тайминги по стадиям нужны планировщику для прогноза стоимости задач
+    save_debug_file(pdf_path, "stats.json", json.dumps(stats, ensure_ascii=False, indent=4))
     return result
@@ -266,6 +266,12 @@ document.addEventListener('DOMContentLoaded', () => {
             });
 
             const payload = await response.json().catch(() => ({}));
+            if (response.status === 429) {
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || payload.retry_after || 5;
+                addToLog(`Сервер перегружен, повтор ${file.name} через ${retryAfter} с`, 'warning');
+                await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+                return processFile(file);
+            }
             if (!response.ok) {
                 throw new Error(payload.error || 'Сервер вернул ошибку');
             }
@@ -0,0 +1,244 @@
+"""Measure peak memory and large allocations of the page preprocessing pipeline.
+
+Compares three variants on the same pages:
+    - ``baseline``: the original PIL-based ``enhance_quality`` (RGB PIL input,
+      ``np.array``/``copy``/``fromarray`` round-trips), reproduced below;
+    - ``fresh``: the numpy pipeline with new ``PageBuffers`` for every page;
+    - ``reuse``: the numpy pipeline with one shared ``PageBuffers`` (production).
+
+Each variant runs in its own interpreter, so the reported peak RSS belongs to
+that variant alone. Allocations are counted with glibc ``mallinfo2`` sampled
+around every C call: unlike tracemalloc it also sees memory allocated by
+Pillow and OpenCV. An allocation is counted when in-use heap grows by at least
+``--min-alloc-kib`` across one call. Linux/glibc only.
+
+Usage:
+    python tools/benchmark_preprocessing.py --pdf uploads/001.pdf
+    python tools/benchmark_preprocessing.py --synthetic 3 --skew 1.5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from file_processing_backend.profiling import heap_in_use  # noqa: E402
+from file_processing_backend.text_extractor import (  # noqa: E402
+    ImageProcessor,
+    PageBuffers,
+    RENDER_DPI,
+    page_to_gray,
+)
+
+VARIANTS = ("baseline", "fresh", "reuse")
+
+
+class HeapSampler:
+    """Считает крупные аллокации по росту занятой кучи между C-вызовами"""
+
+    def __init__(self, min_alloc_bytes: int):
+        if heap_in_use() is None:
+            raise SystemExit("Нужен glibc 2.33+ (mallinfo2)")
+        self.min_alloc_bytes = min_alloc_bytes
+        self.reset()
+
+    def in_use(self) -> int:
+        return heap_in_use()
+
+    def reset(self) -> None:
+        self.start = self.last = self.peak = self.in_use()
+        self.allocations = 0
+        self.allocated_bytes = 0
+
+    def _profile(self, frame, event, arg) -> None:
+        if event not in ("c_call", "c_return", "c_exception", "call", "return"):
+            return
+        current = self.in_use()
+        grown = current - self.last
+        if grown >= self.min_alloc_bytes:
+            self.allocations += 1
+            self.allocated_bytes += grown
+        self.peak = max(self.peak, current)
+        self.last = current
+
+    def __enter__(self) -> "HeapSampler":
+        self.reset()
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        sys.setprofile(None)
+
+
+# ---------------------------------------------------------------------------
+# Исходная (до перехода на numpy-буферы) предобработка — эталон для сравнения
+# ---------------------------------------------------------------------------
+
+def _baseline_prepare_binary(gray_img):
+    blur = cv2.GaussianBlur(gray_img, (5, 5), 0)
+    _, thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return cv2.bitwise_not(thresh)
+
+
+def _baseline_estimate_skew_angle(gray_img):
+    binary = _baseline_prepare_binary(gray_img)
+    angles = []
+    for detector in (
+        ImageProcessor._estimate_angle_hough,
+        ImageProcessor._estimate_angle_probabilistic,
+        ImageProcessor._estimate_angle_components,
+    ):
+        angle = detector(binary)
+        if angle is not None:
+            angles.append(angle)
+    if not angles:
+        return 0.0
+    median = float(np.median(angles))
+    filtered = [a for a in angles if abs(a - median) <= 2.5]
+    return float(np.mean(filtered)) if filtered else median
+
+
+def _baseline_scale_for_ocr(gray_img):
+    h, w = gray_img.shape[:2]
+    longest = max(h, w)
+    if longest >= 2200:
+        return gray_img
+    scale = min(2200 / float(longest), 2.5)
+    return cv2.resize(gray_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+
+def baseline_enhance_quality(pil_image):
+    np_img = np.array(pil_image)
+    gray = np_img if np_img.ndim == 2 else cv2.cvtColor(np_img, cv2.COLOR_RGB2GRAY)
+    angle = _baseline_estimate_skew_angle(gray)
+    if abs(angle) < 0.1 or abs(angle) > 30:
+        image = pil_image.copy()
+    else:
+        (h, w) = gray.shape[:2]
+        M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+        rotated = cv2.warpAffine(np_img, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+        image = Image.fromarray(rotated)
+
+    img_np = np.array(image)
+    if len(img_np.shape) == 3:
+        img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
+    img_np = _baseline_scale_for_ocr(img_np)
+    img_np = cv2.fastNlMeansDenoising(img_np, None, h=15, templateWindowSize=7, searchWindowSize=21)
+    img_np = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(img_np)
+    processed = cv2.adaptiveThreshold(img_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 10)
+    processed = cv2.medianBlur(processed, 3)
+    return Image.fromarray(processed)
+
+
+# ---------------------------------------------------------------------------
+
+def synthetic_page(width: int = 2480, height: int = 3508, seed: int = 0, skew: float = 0.0) -> np.ndarray:
+    """A4 at 300 dpi: white sheet with dark 'text' rows and scanner noise."""
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width), 235, dtype=np.uint8)
+    for top in range(200, height - 200, 60):
+        page[top:top + 18, 150:width - 150] = rng.integers(0, 90, size=(18, width - 300), dtype=np.uint8)
+    noise = rng.integers(-20, 20, size=page.shape, dtype=np.int16)
+    page = np.clip(page.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    if skew:
+        M = cv2.getRotationMatrix2D((width // 2, height // 2), skew, 1.0)
+        page = cv2.warpAffine(page, M, (width, height), borderValue=235)
+    return page
+
+
+def load_pages(args: argparse.Namespace) -> List[np.ndarray]:
+    """Серые страницы; baseline получает их RGB-версию, как при старом рендере"""
+    if args.pdf:
+        import fitz  # PyMuPDF: без poppler, тот же DPI, что у пайплайна
+
+        pages = []
+        with fitz.open(str(args.pdf)) as doc:
+            for page in doc:
+                pix = page.get_pixmap(dpi=RENDER_DPI, colorspace=fitz.csGRAY)
+                pages.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy())
+        return pages[:args.max_pages]
+    return [synthetic_page(seed=i, skew=args.skew) for i in range(args.synthetic)]
+
+
+def run_variant(args: argparse.Namespace) -> Dict[str, object]:
+    pages = load_pages(args)
+    # Входы в том виде, в каком их отдавал рендер: RGB для старого кода, L для нового
+    inputs = [Image.fromarray(page).convert("RGB" if args.variant == "baseline" else "L") for page in pages]
+    del pages
+
+    sampler = HeapSampler(args.min_alloc_kib * 1024)
+    shared = PageBuffers()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    per_page = []
+    for image in inputs:
+        buffers = shared if args.variant == "reuse" else PageBuffers()
+        started = time.perf_counter()
+        with sampler:
+            if args.variant == "baseline":
+                baseline_enhance_quality(image)
+            else:
+                ImageProcessor.enhance_quality(page_to_gray(image, buffers), buffers=buffers, tiles=1)
+        # Буферы "fresh" освобождаются вне замера, иначе их free попадёт в следующую страницу
+        del buffers
+        per_page.append({
+            "seconds": round(time.perf_counter() - started, 3),
+            "allocations": sampler.allocations,
+            "allocated_mib": round(sampler.allocated_bytes / 2**20, 1),
+            "heap_peak_mib": round((sampler.peak - sampler.start) / 2**20, 1),
+        })
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"variant": args.variant, "pages": per_page, "rss_growth_mib": round((rss_after - rss_before) / 1024, 1)}
+
+
+def print_variant(report: Dict[str, object]) -> None:
+    print(f"\n{report['variant']}: рост пикового RSS {report['rss_growth_mib']} МиБ")
+    for index, page in enumerate(report["pages"], start=1):
+        print(
+            f"  страница {index}: {page['seconds'] * 1000:8.1f} мс | аллокаций {page['allocations']:3d} "
+            f"({page['allocated_mib']:7.1f} МиБ) | пик кучи {page['heap_peak_mib']:7.1f} МиБ"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark memory usage of the OCR preprocessing pipeline.")
+    parser.add_argument("--pdf", type=Path, help="PDF, страницы которого прогоняются через предобработку")
+    parser.add_argument("--max-pages", type=int, default=5, help="Не больше стольких страниц из PDF")
+    parser.add_argument("--synthetic", type=int, default=3, help="Число синтетических страниц, если --pdf не задан")
+    parser.add_argument("--skew", type=float, default=1.5, help="Наклон синтетических страниц, градусы")
+    parser.add_argument("--min-alloc-kib", type=int, default=256, help="Порог учёта аллокации, КиБ")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.pdf and not args.pdf.exists():
+        raise SystemExit(f"PDF не найден: {args.pdf}")
+
+    if args.variant:
+        print(json.dumps(run_variant(args)))
+        return
+
+    child_args = [arg for arg in sys.argv[1:]]
+    for variant in VARIANTS:
+        completed = subprocess.run(
+            [sys.executable, __file__, *child_args, "--variant", variant],
+            capture_output=True, text=True, check=True,
+        )
+        print_variant(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    main()
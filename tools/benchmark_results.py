@@ -1,34 +1,51 @@
 """Utility to compare OCR/LLM JSON outputs against the ground-truth Excel sheet.
 
+Every run (accuracy per field, per-stage timing and memory from the
+``_stats.json`` files, git revision and settings) is appended to a history
+file. With ``--baseline`` the run is diffed against an earlier one and the
+script exits with status 1 when accuracy, stage latency or the per-document
+heap peak regress past the thresholds. A regressed run is saved with
+``"regressed": true`` and is skipped when a baseline is looked up, unless it
+is named by its run_id. Memory is only measured when the documents were
+processed with ``EXTRACTOR_HEAP_STATS=1`` (and ``EXTRACTOR_WORKERS=1``).
+
 Usage:
     python tools/benchmark_results.py --standard standart.xlsx --uploads uploads
+    python tools/benchmark_results.py --label v2-prompt
+    python tools/benchmark_results.py --baseline previous --max-latency-increase 0.15
 """
 from __future__ import annotations
 
 import argparse
+import datetime
+import hashlib
 import json
 import re
+import statistics
+import subprocess
+import sys
+import time
 from collections import defaultdict
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Tuple
 
 from openpyxl import load_workbook
 
-TARGET_FIELDS = [
-    "Название_файла",
-    "Тип_документа",
-    "Номер_документа",
-    "Дата_документа",
-    "Наименование_заказчика",
-    "Наименование_исполнителя",
-    "ИНН_заказчика",
-    "ИНН_исполнителя",
-    "КПП_заказчика",
-    "КПП_исполнителя",
-    "Адрес_заказчика",
-    "Адрес_исполнителя",
-]
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from file_processing_backend.export import RESULT_FIELDS  # noqa: E402
+
+TARGET_FIELDS = RESULT_FIELDS
+
+STAGE_METRICS = ["ocr_seconds", "llm_seconds", "total_seconds"]
+# Пиковый прирост кучи за документ (HeapWatch); пишется, только если документы
+# обрабатывались с EXTRACTOR_HEAP_STATS=1. Прежние ocr_peak_rss_mb/peak_rss_mb
+# были монотонным пиком процесса и в сравнение не идут
+MEMORY_METRICS = ["ocr_heap_peak_mb", "heap_peak_mb"]
+DEFAULT_WORKERS = 8
 
 STRICT_NUMERIC_FIELDS = {
     "ИНН_заказчика",
@@ -66,32 +83,72 @@ def normalize_value(value: Optional[str], field: str) -> str:
 
 
 def build_expected_rows(standard_path: Path) -> List[Dict[str, str]]:
-    wb = load_workbook(standard_path)
-    ws = wb.active
-    header_row = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-    normalized_headers = [str(h).strip() if h is not None else "" for h in header_row]
-
-    rows = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if all(value is None for value in row):
-            continue
-        row_dict = {
-            header: value
-            for header, value in zip(normalized_headers, row)
-            if header in TARGET_FIELDS
-        }
-        if row_dict:
-            rows.append(row_dict)
-    return rows
-
-
-def guess_upload_name(filename: str) -> str:
+    # read_only: openpyxl читает лист потоково и не строит модель всей книги
+    wb = load_workbook(standard_path, read_only=True)
+    try:
+        ws = wb.active
+        row_iter = ws.iter_rows(values_only=True)
+        header_row = next(row_iter, ())
+        normalized_headers = [str(h).strip() if h is not None else "" for h in header_row]
+
+        rows = []
+        for row in row_iter:
+            if all(value is None for value in row):
+                continue
+            row_dict = {
+                header: value
+                for header, value in zip(normalized_headers, row)
+                if header in TARGET_FIELDS
+            }
+            if row_dict:
+                rows.append(row_dict)
+        return rows
+    finally:
+        wb.close()
+
+
+def guess_upload_name(filename: str, version: Optional[str] = None) -> str:
+    suffix = f"_result_{version}.json" if version else "_result.json"
     stem = Path(filename).stem.lstrip("_")
     digits = re.sub(r"\D", "", stem)
     if digits:
         index = int(digits)
-        return f"{index:03d}_result.json"
-    return f"{stem}_result.json"
+        return f"{index:03d}{suffix}"
+    return f"{stem}{suffix}"
+
+
+def guess_stats_name(json_name: str) -> str:
+    return f"{json_name[:json_name.rindex('_result')]}_stats.json"
+
+
+@dataclass
+class LoadedDocument:
+    json_name: str
+    payload: Optional[dict] = None
+    error: Optional[str] = None
+    stats: Dict[str, float] = field(default_factory=dict)
+
+
+def load_document(uploads_dir: Path, json_name: str) -> LoadedDocument:
+    document = LoadedDocument(json_name)
+    json_path = uploads_dir / json_name
+    if not json_path.exists():
+        document.error = json_name
+        return document
+
+    try:
+        document.payload = json.loads(json_path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError as exc:
+        document.error = f"{json_name} (invalid JSON: {exc})"
+        return document
+
+    stats_path = uploads_dir / guess_stats_name(json_name)
+    if stats_path.exists():
+        try:
+            document.stats = json.loads(stats_path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            pass
+    return document
 
 
 @dataclass
@@ -100,6 +157,9 @@ class ComparisonResult:
     total: int
     missing_files: List[str]
     field_mismatches: Dict[str, List[Tuple[str, str, str]]]
+    field_matched: Dict[str, int] = field(default_factory=dict)
+    documents: int = 0
+    stage_samples: Dict[str, List[float]] = field(default_factory=dict)
 
     @property
     def accuracy(self) -> float:
@@ -107,40 +167,59 @@ class ComparisonResult:
             return 0.0
         return self.matched / self.total
 
-
-def compare_results(expected_rows: Iterable[Dict[str, str]], uploads_dir: Path) -> ComparisonResult:
+    @property
+    def field_accuracy(self) -> Dict[str, float]:
+        if self.documents == 0:
+            return {name: 0.0 for name in TARGET_FIELDS}
+        return {name: self.field_matched.get(name, 0) / self.documents for name in TARGET_FIELDS}
+
+
+def compare_results(
+    expected_rows: Iterable[Dict[str, str]],
+    uploads_dir: Path,
+    version: Optional[str] = None,
+    workers: int = DEFAULT_WORKERS,
+) -> ComparisonResult:
     matched = 0
     total = 0
     missing_files: List[str] = []
     field_mismatches: Dict[str, List[Tuple[str, str, str]]] = defaultdict(list)
+    field_matched: Dict[str, int] = defaultdict(int)
+    stage_samples: Dict[str, List[float]] = defaultdict(list)
+
+    expected_rows = list(expected_rows)
+    json_names = [guess_upload_name(str(expected.get("Название_файла", "")), version) for expected in expected_rows]
+    # Чтение сотен JSON с (сетевого) диска упирается в I/O — грузим пулом потоков
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        documents = list(pool.map(lambda name: load_document(uploads_dir, name), json_names))
 
-    for expected in expected_rows:
+    for expected, document in zip(expected_rows, documents):
         filename = str(expected.get("Название_файла", ""))
-        json_name = guess_upload_name(filename)
-        json_path = uploads_dir / json_name
 
-        if not json_path.exists():
-            missing_files.append(json_name)
+        if document.payload is None:
+            missing_files.append(document.error)
             total += len(TARGET_FIELDS)
             continue
 
-        try:
-            payload = json.loads(json_path.read_text(encoding="utf-8"))
-        except json.JSONDecodeError as exc:
-            missing_files.append(f"{json_name} (invalid JSON: {exc})")
-            total += len(TARGET_FIELDS)
-            continue
+        for metric in STAGE_METRICS + MEMORY_METRICS:
+            value = document.stats.get(metric)
+            if isinstance(value, (int, float)):
+                stage_samples[metric].append(float(value))
 
-        for field in TARGET_FIELDS:
-            expected_value = normalize_value(expected.get(field), field)
-            actual_value = normalize_value(payload.get(field), field)
+        for name in TARGET_FIELDS:
+            expected_value = normalize_value(expected.get(name), name)
+            actual_value = normalize_value(document.payload.get(name), name)
             total += 1
             if expected_value == actual_value:
                 matched += 1
+                field_matched[name] += 1
             else:
-                field_mismatches[field].append((filename, expected_value, actual_value))
+                field_mismatches[name].append((filename, expected_value, actual_value))
 
-    return ComparisonResult(matched, total, missing_files, field_mismatches)
+    return ComparisonResult(
+        matched, total, missing_files, field_mismatches,
+        dict(field_matched), len(expected_rows), dict(stage_samples),
+    )
 
 
 def print_report(result: ComparisonResult) -> None:
@@ -157,16 +236,174 @@ def print_report(result: ComparisonResult) -> None:
         return
 
     print("\nТоп расхождений по полям:")
-    for field, mismatches in result.field_mismatches.items():
-        print(f"\n{field} (несовпадений: {len(mismatches)})")
+    for name, mismatches in result.field_mismatches.items():
+        print(f"\n{name} (несовпадений: {len(mismatches)})")
         for filename, expected_value, actual_value in mismatches[:5]:
             print(f"  {filename}: ожидалось '{expected_value}' | получено '{actual_value}'")
 
 
+# =========================================================
+# ИСТОРИЯ ПРОГОНОВ И ПОРОГИ РЕГРЕССИИ
+# =========================================================
+
+@dataclass
+class Thresholds:
+    max_accuracy_drop: float = 0.01        # абсолютное падение общей точности (0.01 = 1 п.п.)
+    max_field_accuracy_drop: float = 0.05  # абсолютное падение точности любого поля
+    max_latency_increase: float = 0.20     # относительный рост медианы времени стадии
+    min_latency_delta: float = 0.5         # рост меньше стольких секунд считается шумом
+    max_memory_increase: float = 0.25      # относительный рост медианы пика кучи за документ
+    min_memory_delta: float = 16.0         # рост меньше стольких МиБ считается шумом
+
+
+def summarize_samples(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    p95_index = min(int(round(0.95 * (len(ordered) - 1))), len(ordered) - 1)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 3),
+        "p50": round(statistics.median(ordered), 3),
+        "p95": round(ordered[p95_index], 3),
+    }
+
+
+def git_revision(repo_root: Path) -> Dict[str, object]:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=repo_root, capture_output=True, text=True, check=True,
+        ).stdout
+        return {"revision": revision, "dirty": bool(status.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {"revision": "unknown", "dirty": None}
+
+
+def settings_summary(settings_path: Path) -> Dict[str, object]:
+    if not settings_path.exists():
+        return {"path": str(settings_path), "sha1": None}
+    raw = settings_path.read_bytes()
+    settings = json.loads(raw.decode("utf-8"))
+    return {
+        "path": str(settings_path),
+        "sha1": hashlib.sha1(raw).hexdigest()[:10],
+        "model": settings.get("model"),
+        "prompt_sha1": hashlib.sha1(str(settings.get("prompt", "")).encode("utf-8")).hexdigest()[:10],
+    }
+
+
+def build_run_record(
+    result: ComparisonResult, args: argparse.Namespace, eval_seconds: float
+) -> Dict[str, object]:
+    samples = result.stage_samples
+    return {
+        "run_id": datetime.datetime.now().strftime("%Y%m%d-%H%M%S"),
+        "label": args.label,
+        "git": git_revision(REPO_ROOT),
+        "settings": settings_summary(args.settings),
+        "result_version": args.version,
+        "documents": result.documents,
+        "missing_files": len(result.missing_files),
+        "accuracy": round(result.accuracy, 5),
+        "field_accuracy": {name: round(value, 5) for name, value in result.field_accuracy.items()},
+        "timing": {metric: summarize_samples(samples[metric]) for metric in STAGE_METRICS if samples.get(metric)},
+        "memory": {metric: summarize_samples(samples[metric]) for metric in MEMORY_METRICS if samples.get(metric)},
+        "eval_seconds": round(eval_seconds, 3),
+    }
+
+
+def load_history(history_path: Path) -> List[Dict[str, object]]:
+    if not history_path.exists():
+        return []
+    records = []
+    with history_path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def append_history(history_path: Path, record: Dict[str, object]) -> None:
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with history_path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def find_baseline(history: List[Dict[str, object]], ref: str) -> Optional[Dict[str, object]]:
+    """'previous' — последний прогон; иначе run_id, метка или префикс git-ревизии.
+
+    Прогоны с регрессией базой не становятся (кроме явно указанного run_id),
+    иначе повторный запуск сравнивал бы регрессию саму с собой и проходил.
+    """
+    for record in reversed(history):
+        if record.get("run_id") == ref:
+            return record
+        if record.get("regressed"):
+            continue
+        if ref == "previous" or record.get("label") == ref:
+            return record
+        if str(record.get("git", {}).get("revision", "")).startswith(ref):
+            return record
+    return None
+
+
+def diff_runs(baseline: Dict[str, object], current: Dict[str, object], thresholds: Thresholds) -> List[str]:
+    """Печатает сравнение двух прогонов и возвращает список нарушенных порогов"""
+    violations: List[str] = []
+    print(f"\nСравнение с прогоном {baseline['run_id']} ({str(baseline['git']['revision'])[:10]}):")
+    print(f"  {'метрика':<32} {'база':>10} {'сейчас':>10} {'дельта':>10}")
+
+    def row(name: str, before: float, after: float) -> None:
+        print(f"  {name:<32} {before:10.3f} {after:10.3f} {after - before:+10.3f}")
+
+    row("accuracy", baseline["accuracy"], current["accuracy"])
+    if baseline["accuracy"] - current["accuracy"] > thresholds.max_accuracy_drop:
+        violations.append(f"общая точность упала с {baseline['accuracy']:.4f} до {current['accuracy']:.4f}")
+
+    for name, after in current["field_accuracy"].items():
+        before = baseline.get("field_accuracy", {}).get(name)
+        if before is None:
+            continue
+        row(f"accuracy:{name}", before, after)
+        if before - after > thresholds.max_field_accuracy_drop:
+            violations.append(f"точность поля {name} упала с {before:.4f} до {after:.4f}")
+
+    for section, limit, min_delta in (
+        ("timing", thresholds.max_latency_increase, thresholds.min_latency_delta),
+        ("memory", thresholds.max_memory_increase, thresholds.min_memory_delta),
+    ):
+        for metric, summary in current.get(section, {}).items():
+            base_summary = baseline.get(section, {}).get(metric)
+            if not base_summary:
+                continue
+            before, after = base_summary["p50"], summary["p50"]
+            row(f"{metric} p50", before, after)
+            row(f"{metric} p95", base_summary["p95"], summary["p95"])
+            if before > 0 and after - before > min_delta and (after - before) / before > limit:
+                violations.append(f"{metric} p50 вырос с {before:.3f} до {after:.3f} (+{(after - before) / before:.0%})")
+
+    return violations
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Compare OCR JSON outputs with the standard Excel file.")
     parser.add_argument("--standard", type=Path, default=Path("standart.xlsx"), help="Путь к эталонной таблице (Excel)")
     parser.add_argument("--uploads", type=Path, default=Path("uploads"), help="Папка с результатами JSON")
+    parser.add_argument("--version", help="Оценивать результаты перепрогона _result_<версия>.json")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Потоков для чтения JSON")
+    parser.add_argument("--settings", type=Path, default=Path("settings.json"), help="Настройки, записываемые в историю")
+    parser.add_argument("--history", type=Path, default=Path("benchmarks/history.jsonl"), help="Файл истории прогонов")
+    parser.add_argument("--label", help="Метка прогона (можно использовать как --baseline)")
+    parser.add_argument("--baseline", help="С чем сравнивать: previous, run_id, метка или git-ревизия")
+    parser.add_argument("--no-save", action="store_true", help="Не записывать прогон в историю")
+    parser.add_argument("--max-accuracy-drop", type=float, default=Thresholds.max_accuracy_drop)
+    parser.add_argument("--max-field-accuracy-drop", type=float, default=Thresholds.max_field_accuracy_drop)
+    parser.add_argument("--max-latency-increase", type=float, default=Thresholds.max_latency_increase)
+    parser.add_argument("--min-latency-delta", type=float, default=Thresholds.min_latency_delta)
+    parser.add_argument("--max-memory-increase", type=float, default=Thresholds.max_memory_increase)
+    parser.add_argument("--min-memory-delta", type=float, default=Thresholds.min_memory_delta)
     return parser.parse_args()
 
 
@@ -177,10 +414,41 @@ def main() -> None:
     if not args.uploads.exists():
         raise SystemExit(f"Папка с результатами не найдена: {args.uploads}")
 
+    started = time.perf_counter()
     expected_rows = build_expected_rows(args.standard)
-    comparison = compare_results(expected_rows, args.uploads)
+    comparison = compare_results(expected_rows, args.uploads, version=args.version, workers=args.workers)
     print_report(comparison)
 
+    record = build_run_record(comparison, args, time.perf_counter() - started)
+    history = load_history(args.history)
+
+    violations: List[str] = []
+    if args.baseline:
+        baseline = find_baseline(history, args.baseline)
+        if baseline is None:
+            raise SystemExit(f"Базовый прогон не найден в {args.history}: {args.baseline}")
+        thresholds = Thresholds(
+            max_accuracy_drop=args.max_accuracy_drop,
+            max_field_accuracy_drop=args.max_field_accuracy_drop,
+            max_latency_increase=args.max_latency_increase,
+            min_latency_delta=args.min_latency_delta,
+            max_memory_increase=args.max_memory_increase,
+            min_memory_delta=args.min_memory_delta,
+        )
+        violations = diff_runs(baseline, record, thresholds)
+        record["regressed"] = bool(violations)
+
+    if not args.no_save:
+        append_history(args.history, record)
+        note = " (с регрессией, базой не станет)" if violations else ""
+        print(f"\nПрогон {record['run_id']} сохранён в {args.history}{note}")
+
+    if violations:
+        print("\nРЕГРЕССИЯ:")
+        for violation in violations:
+            print(f"  - {violation}")
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
     main()
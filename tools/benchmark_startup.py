@@ -0,0 +1,100 @@
+"""Track cold-start latency: module import time and the first processed page.
+
+Every measurement runs in a fresh interpreter so nothing is cached in-process:
+    - import of app.py (what the dev server pays on every reload);
+    - first vs second preprocessing of a synthetic page without warm-up;
+    - the same after an explicit ``warm_up()``.
+
+Usage:
+    python tools/benchmark_startup.py
+    python tools/benchmark_startup.py --runs 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+IMPORT_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import app
+print(json.dumps({"import_app": time.perf_counter() - started}))
+"""
+
+FIRST_PAGE_SNIPPET = """
+import json, time
+import numpy as np
+from file_processing_backend.text_extractor import ImageProcessor, warm_up
+
+timings = {}
+if %(warm)s:
+    started = time.perf_counter()
+    warm_up()
+    timings["warm_up"] = time.perf_counter() - started
+
+page = np.full((3508, 2480), 235, dtype=np.uint8)
+page[300:3200:60, 150:2330] = 20
+for name in ("first_page", "second_page"):
+    started = time.perf_counter()
+    ImageProcessor.enhance_quality(page)
+    timings[name] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def run_snippet(code: str) -> Dict[str, float]:
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Последняя строка — JSON, всё остальное — логи [WARMUP]/[DEBUG]
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def collect(runs: int) -> Dict[str, List[float]]:
+    samples: Dict[str, List[float]] = {}
+    for _ in range(runs):
+        measurements = [
+            ("", run_snippet(IMPORT_SNIPPET)),
+            ("cold_", run_snippet(FIRST_PAGE_SNIPPET % {"warm": False})),
+            ("warm_", run_snippet(FIRST_PAGE_SNIPPET % {"warm": True})),
+        ]
+        for prefix, timings in measurements:
+            for name, seconds in timings.items():
+                samples.setdefault(prefix + name, []).append(seconds)
+    return samples
+
+
+def print_report(samples: Dict[str, List[float]]) -> None:
+    print(f"{'метрика':<20} {'медиана, мс':>12} {'мин, мс':>10}")
+    for name, values in samples.items():
+        print(f"{name:<20} {statistics.median(values) * 1000:12.1f} {min(values) * 1000:10.1f}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark import time and first-request latency.")
+    parser.add_argument("--runs", type=int, default=3, help="Сколько раз повторить каждый замер")
+    parser.add_argument("--json", type=Path, help="Сохранить сырые замеры в JSON")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    samples = collect(max(args.runs, 1))
+    print_report(samples)
+    if args.json:
+        args.json.write_text(json.dumps(samples, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
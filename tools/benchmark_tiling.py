@@ -0,0 +1,92 @@
+"""Compare tiled and untiled page preprocessing: speedup and output difference.
+
+Runs ``ImageProcessor.enhance_quality`` on the same page with ``tiles=1``
+(reference) and with 2, 4, ... strips up to the number of CPU cores, and
+reports latency, speedup and the share of pixels that differ from the
+reference.
+
+Usage:
+    python tools/benchmark_tiling.py
+    python tools/benchmark_tiling.py --pdf uploads/001.pdf --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from benchmark_preprocessing import synthetic_page  # noqa: E402
+from file_processing_backend.text_extractor import ImageProcessor, PageBuffers, page_to_gray  # noqa: E402
+
+
+def load_page(pdf: Path | None) -> np.ndarray:
+    if pdf is None:
+        return synthetic_page()
+    from pdf2image import convert_from_path
+    from file_processing_backend.text_extractor import POPLER_PATH, RENDER_DPI
+
+    images = convert_from_path(str(pdf), poppler_path=POPLER_PATH, dpi=RENDER_DPI, grayscale=True,
+                               first_page=1, last_page=1)
+    return np.array(page_to_gray(images[0]))
+
+
+def time_run(page: np.ndarray, tiles: int, repeat: int) -> tuple[float, np.ndarray]:
+    buffers = PageBuffers()
+    ImageProcessor.enhance_quality(page, buffers=buffers, tiles=tiles)  # прогрев буферов
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = ImageProcessor.enhance_quality(page, buffers=buffers, tiles=tiles)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), output.copy()
+
+
+def tile_counts(max_tiles: int) -> List[int]:
+    counts = [1]
+    while counts[-1] * 2 <= max_tiles:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_tiles:
+        counts.append(max_tiles)
+    return counts
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark tiled denoise/threshold against the untiled pipeline.")
+    parser.add_argument("--pdf", type=Path, help="PDF, первая страница которого используется (иначе синтетика)")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов на каждую конфигурацию")
+    parser.add_argument("--max-tiles", type=int, default=os.cpu_count() or 1, help="Максимальное число полос")
+    parser.add_argument("--tolerance", type=float, default=0.0005, help="Допустимая доля отличающихся пикселей")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    page = load_page(args.pdf)
+    print(f"Страница {page.shape[1]}x{page.shape[0]}, ядер: {os.cpu_count()}")
+
+    reference_time, reference = time_run(page, 1, args.repeat)
+    print(f"{'полос':>6} {'мс':>9} {'ускорение':>10} {'отличий':>10}")
+    print(f"{1:>6} {reference_time * 1000:9.1f} {1.0:10.2f} {0.0:10.5f}")
+
+    failed = False
+    for tiles in tile_counts(max(args.max_tiles, 1))[1:]:
+        elapsed, output = time_run(page, tiles, args.repeat)
+        mismatch = float(np.count_nonzero(output != reference)) / output.size
+        failed = failed or mismatch > args.tolerance
+        print(f"{tiles:>6} {elapsed * 1000:9.1f} {reference_time / elapsed:10.2f} {mismatch:10.5f}")
+
+    if failed:
+        raise SystemExit(f"Полосная обработка отличается от эталона больше допуска {args.tolerance}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Regression check and calibration report for the blank/duplicate page filter.
+
+Synthetic cases (must hold, exit code 1 otherwise):
+    - same-template invoices that differ only in the INN or invoice number are
+      NOT duplicates, so one customer's details never reach another document;
+    - a rescan of the same page (scanner noise, sub-pixel shift, JPEG) IS a
+      duplicate;
+    - a page with a single line of text is NOT blank, a noisy empty sheet IS.
+
+Corpus report (``--uploads``): renders every PDF at the pipeline DPI and prints
+blank pages, within-document repeats, the difference-spot areas of known
+repeated documents (``--pair``) and, with ``--cross``, of same-template first
+pages of different documents, so thresholds in page_filter.py can be
+re-calibrated when the scanners change.
+
+Usage:
+    python tools/check_page_filter.py
+    python tools/check_page_filter.py --uploads uploads --cross --pair Untitled.pdf:Untitled_.pdf
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from file_processing_backend.page_filter import (  # noqa: E402
+    DIFF_MIN_AREA,
+    difference_spots,
+    page_signature,
+    pages_match,
+)
+from file_processing_backend.text_extractor import RENDER_DPI  # noqa: E402
+
+A4 = (2480, 3508)
+# Пары цифр с наименьшим различием начертания: 5/6, 9/8, 3/8, 1/7, 0/8
+DIGIT_SWAPS = [("7", "8"), ("3", "8"), ("5", "6"), ("1", "7"), ("0", "8"), ("9", "8")]
+
+
+def _font(size: int):
+    return ImageFont.load_default(size=size)
+
+
+def synthetic_invoice(number: str, inn: str, font_size: int = 42) -> np.ndarray:
+    """Счёт одного шаблона: отличаются только номер и ИНН"""
+    image = Image.new("L", A4, 255)
+    draw = ImageDraw.Draw(image)
+    font, title = _font(font_size), _font(int(font_size * 1.4))
+    draw.text((200, 200), f"INVOICE No {number} dated 12.03.2024", fill=0, font=title)
+    top = 400
+    for line in ("Supplier: OOO Romashka, Moscow, Lenina st. 1", f"INN {inn}  KPP 770101001",
+                 "Buyer: OOO Vasilek, Kazan, Pushkina st. 12", "Bank: Sberbank  BIK 044525225"):
+        draw.text((200, top), line, fill=0, font=font)
+        top += 80
+    top += 60
+    for row in range(12):
+        draw.rectangle((200, top, A4[0] - 200, top + 70), outline=0, width=3)
+        draw.text((220, top + 12), f"{row + 1}  Goods item {row + 1}   pcs  {10 + row}   {(row + 1) * 1234}.00",
+                  fill=0, font=font)
+        top += 70
+    draw.text((200, top + 100), "Total: 96 252.00  incl. VAT 20%", fill=0, font=title)
+    return np.asarray(image).copy()
+
+
+def one_line_page(font_size: int = 42) -> np.ndarray:
+    image = Image.new("L", A4, 255)
+    ImageDraw.Draw(image).text((200, 300), "This page is intentionally left blank.", fill=0, font=_font(font_size))
+    return np.asarray(image).copy()
+
+
+def empty_sheet(seed: int, noise: int = 10, specks: int = 40) -> np.ndarray:
+    """Пустой лист со сканерным шумом и пылинками"""
+    rng = np.random.default_rng(seed)
+    sheet = np.clip(235 + rng.integers(-noise, noise + 1, size=A4[::-1]), 0, 255).astype(np.uint8)
+    for _ in range(specks):
+        x, y = (int(v) for v in rng.integers(0, A4[0] - 5, size=2))
+        cv2.circle(sheet, (x, min(y, A4[1] - 5)), int(rng.integers(1, 3)), 60, -1)
+    return sheet
+
+
+def scan(page: np.ndarray, seed: int, noise: int = 10, shift: Tuple[float, float] = (0.0, 0.0),
+         jpeg_quality: int | None = None) -> np.ndarray:
+    """Имитация скана: сдвиг, размытие оптики, шум ±noise и, по желанию, JPEG"""
+    rng = np.random.default_rng(seed)
+    h, w = page.shape
+    out = cv2.warpAffine(page, np.float32([[1, 0, shift[0]], [0, 1, shift[1]]]), (w, h),
+                         flags=cv2.INTER_LINEAR, borderValue=255)
+    out = cv2.GaussianBlur(out, (3, 3), 0.8)
+    out = np.clip(out * 0.9 + 15 + rng.integers(-noise, noise + 1, size=out.shape), 0, 255).astype(np.uint8)
+    if jpeg_quality:
+        _, encoded = cv2.imencode(".jpg", out, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        out = cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+    return out
+
+
+def run_synthetic_checks() -> List[str]:
+    failures = []
+
+    def expect(name: str, ok: bool, detail: str) -> None:
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    print("Счета одного шаблона с разными реквизитами (не должны совпасть):")
+    base_inn = "770123456"
+    for font_size in (34, 42):
+        for old, new in DIGIT_SWAPS:
+            a = scan(synthetic_invoice("1024", base_inn + old, font_size), seed=1)
+            b = scan(synthetic_invoice("1024", base_inn + new, font_size), seed=2, shift=(0.6, 1.3))
+            spots = difference_spots(a, b)
+            expect(f"ИНН ...{old} vs ...{new}, {font_size} px", not pages_match(a, b), f"пятно {spots} px")
+    a = synthetic_invoice("1024", base_inn + "7")
+    b = synthetic_invoice("1025", base_inn + "7")
+    expect("номер 1024 vs 1025, без шума", not pages_match(a, b), f"пятно {difference_spots(a, b)} px")
+
+    print("Повторные сканы одной страницы (должны совпасть):")
+    page = synthetic_invoice("2048", "5024006135")
+    rescans = {
+        "шум ±10": (scan(page, 1), scan(page, 2)),
+        "шум ±10, сдвиг 1.4/-0.7 px": (scan(page, 1), scan(page, 2, shift=(1.4, -0.7))),
+        "JPEG 40/50, сдвиг 2.2 px": (scan(page, 3, noise=12, jpeg_quality=40),
+                                     scan(page, 4, noise=12, shift=(-2.2, 0.9), jpeg_quality=50)),
+        "оригинал vs скан": (page, scan(page, 5, shift=(3.0, 1.0))),
+    }
+    for name, (a, b) in rescans.items():
+        expect(name, pages_match(a, b), f"пятно {difference_spots(a, b)} px")
+
+    print("Пустые страницы:")
+    for font_size in (34, 42):
+        signature = page_signature(scan(one_line_page(font_size), seed=6))
+        expect(f"одна строка текста, {font_size} px", not signature.is_blank,
+               f"чернил {signature.ink_ratio:.5f}, букв {signature.text_components}")
+    for seed in (7, 8):
+        signature = page_signature(empty_sheet(seed))
+        expect(f"пустой лист с шумом #{seed}", signature.is_blank,
+               f"чернил {signature.ink_ratio:.5f}, букв {signature.text_components}")
+    return failures
+
+
+def render_pdf(path: Path, max_pages: int) -> List[np.ndarray]:
+    import fitz  # PyMuPDF: без poppler, тот же DPI, что у пайплайна
+
+    pages = []
+    with fitz.open(str(path)) as doc:
+        for page in list(doc)[:max_pages]:
+            pix = page.get_pixmap(dpi=RENDER_DPI, colorspace=fitz.csGRAY)
+            pages.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy())
+    return pages
+
+
+def run_corpus_report(uploads: Path, pairs: List[Tuple[str, str]], max_pages: int, cross: bool) -> List[str]:
+    failures = []
+    pdfs = sorted(uploads.glob("*.pdf"))
+    print(f"\nКорпус {uploads}: {len(pdfs)} PDF")
+    within: Dict[str, List[Tuple[int, int, int | None]]] = {}
+    first_pages = []
+    total_pages = blank_pages = 0
+    for pdf in pdfs:
+        pages = render_pdf(pdf, max_pages)
+        signatures = [page_signature(page) for page in pages]
+        total_pages += len(pages)
+        if cross and pages:
+            first_pages.append((pdf.name, signatures[0], pages[0]))
+        for index, signature in enumerate(signatures, start=1):
+            if signature.is_blank:
+                blank_pages += 1
+                print(f"  пустая: {pdf.name} стр. {index} (чернил {signature.ink_ratio:.5f}, "
+                      f"букв {signature.text_components})")
+        for i in range(len(pages)):
+            for j in range(i):
+                if signatures[i].is_candidate_for(signatures[j]):
+                    within.setdefault(pdf.name, []).append((j + 1, i + 1, difference_spots(pages[j], pages[i])))
+    print(f"  страниц {total_pages}, пустых {blank_pages}")
+
+    print("Кандидаты в повторы внутри документов (пятно < "
+          f"{DIFF_MIN_AREA} px — текст будет переиспользован):")
+    for name, found in within.items():
+        for first, second, spots in found:
+            verdict = "ПОВТОР" if spots is not None and spots < DIFF_MIN_AREA else "разные"
+            print(f"  {name}: стр. {first} и {second} — пятно {spots} px, {verdict}")
+
+    if cross:
+        # Между документами текст берётся только по дайджесту; отчёт показывает запас порога
+        # на документах одного шаблона, которые совпадения дайджеста не дадут
+        aligned = []
+        for i in range(len(first_pages)):
+            for j in range(i):
+                (name_a, sig_a, page_a), (name_b, sig_b, page_b) = first_pages[j], first_pages[i]
+                if sig_a.digest != sig_b.digest and sig_a.is_candidate_for(sig_b):
+                    spots = difference_spots(page_a, page_b)
+                    if spots is not None:
+                        aligned.append((spots, name_a, name_b))
+        aligned.sort()
+        print(f"Первые страницы разных документов, совместившиеся друг с другом: {len(aligned)}")
+        for spots, name_a, name_b in aligned[:10]:
+            verdict = "ПОВТОР" if spots < DIFF_MIN_AREA else "разные"
+            print(f"  {name_a} / {name_b}: пятно {spots} px, {verdict}")
+
+    for left, right in pairs:
+        pages_left = render_pdf(uploads / left, max_pages)
+        pages_right = render_pdf(uploads / right, max_pages)
+        print(f"Известный повтор {left} / {right}:")
+        for index, (a, b) in enumerate(zip(pages_left, pages_right), start=1):
+            spots = difference_spots(a, b)
+            ok = spots is not None and spots < DIFF_MIN_AREA
+            print(f"  [{'OK' if ok else 'FAIL'}] стр. {index}: пятно {spots} px")
+            if not ok:
+                failures.append(f"{left}/{right} стр. {index}")
+    return failures
+
+
+def parse_pair(value: str) -> Tuple[str, str]:
+    left, sep, right = value.partition(":")
+    if not sep:
+        raise argparse.ArgumentTypeError("ожидается ИМЯ1.pdf:ИМЯ2.pdf")
+    return left, right
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check blank/duplicate page detection thresholds.")
+    parser.add_argument("--uploads", type=Path, help="Папка с PDF для отчёта по корпусу")
+    parser.add_argument("--pair", type=parse_pair, action="append", default=[],
+                        help="Два файла с одними и теми же страницами (повторный скан), ИМЯ1.pdf:ИМЯ2.pdf")
+    parser.add_argument("--max-pages", type=int, default=20, help="Не больше стольких страниц из каждого PDF")
+    parser.add_argument("--cross", action="store_true",
+                        help="Сравнить первые страницы разных документов (документы одного шаблона)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    failures = run_synthetic_checks()
+    if args.uploads:
+        failures += run_corpus_report(args.uploads, args.pair, args.max_pages, args.cross)
+    if failures:
+        print(f"\nПровалено проверок: {len(failures)}")
+        raise SystemExit(1)
+    print("\nВсе проверки пройдены")
+
+
+if __name__ == "__main__":
+    main()
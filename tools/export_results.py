@@ -0,0 +1,65 @@
+"""Export processed results to CSV or XLSX in the fixed 12-field order.
+
+Rows are read one result file at a time and written with a streaming writer,
+so memory stays flat for tens of thousands of documents.
+
+Usage:
+    python tools/export_results.py --output results.csv
+    python tools/export_results.py --output results.xlsx --since 2025-01-01 --until 2025-01-31
+    python tools/export_results.py --output qwen2.csv --version qwen2
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from file_processing_backend.export import iter_rows, stream_csv, validate_delimiter, write_xlsx  # noqa: E402
+
+
+def parse_date(value: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"ожидается дата ГГГГ-ММ-ДД: {value}") from exc
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stream processed results into a CSV or XLSX file.")
+    parser.add_argument("--uploads", type=Path, default=Path("uploads"), help="Папка с результатами JSON")
+    parser.add_argument("--output", type=Path, required=True, help="Файл .csv или .xlsx")
+    parser.add_argument("--since", type=parse_date, help="Только результаты, изменённые с этой даты")
+    parser.add_argument("--until", type=parse_date, help="Только результаты, изменённые по эту дату")
+    parser.add_argument("--version", help="Версия перепрогона (файлы _result_<версия>.json)")
+    parser.add_argument("--prefix", help="Только файлы с этим началом имени")
+    parser.add_argument("--delimiter", default=",", help="Разделитель CSV")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if not args.uploads.exists():
+        raise SystemExit(f"Папка с результатами не найдена: {args.uploads}")
+    try:
+        validate_delimiter(args.delimiter)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    rows = iter_rows(str(args.uploads), since=args.since, until=args.until, version=args.version, prefix=args.prefix)
+    if args.output.suffix.lower() == ".xlsx":
+        count = write_xlsx(rows, str(args.output))
+    else:
+        count = 0
+        with args.output.open("w", encoding="utf-8", newline="") as f:
+            for chunk in stream_csv(rows, delimiter=args.delimiter):
+                f.write(chunk)
+                count += 1
+            count -= 1  # первый кусок — заголовок
+    print(f"Выгружено строк: {count} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
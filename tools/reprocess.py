@@ -0,0 +1,65 @@
+"""Re-run only the LLM stage over stored OCR text with new settings.
+
+Reads ``<name>_raw_ocr.txt`` from the uploads folder, sends it to the model
+configured in the settings file (optionally overridden from the command line)
+and writes ``<name>_result_<version>.json`` next to the original results.
+
+Usage:
+    python tools/reprocess.py --settings settings.json --concurrency 8
+    python tools/reprocess.py 001.pdf 002.pdf --model Qwen/Qwen2-7B-Instruct-GGUF --version qwen2
+    python tools/reprocess.py --prompt-file new_prompt.txt
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from file_processing_backend.reprocess import DEFAULT_CONCURRENCY, reprocess_documents  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Re-run LLM extraction over cached OCR text.")
+    parser.add_argument("documents", nargs="*", help="Документы (001.pdf или 001); по умолчанию все с _raw_ocr.txt")
+    parser.add_argument("--uploads", type=Path, default=Path("uploads"), help="Папка с OCR и результатами")
+    parser.add_argument("--settings", type=Path, default=Path("settings.json"), help="Базовые настройки (как в settings.json)")
+    parser.add_argument("--model", help="Переопределить модель из настроек")
+    parser.add_argument("--api-url", help="Переопределить адрес API")
+    parser.add_argument("--prompt-file", type=Path, help="Файл с новым шаблоном промта")
+    parser.add_argument("--version", help="Метка версии результатов (по умолчанию хэш настроек)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Параллельных запросов к LLM")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if not args.uploads.exists():
+        raise SystemExit(f"Папка с результатами не найдена: {args.uploads}")
+    if not args.settings.exists():
+        raise SystemExit(f"Файл настроек не найден: {args.settings}")
+
+    settings = json.loads(args.settings.read_text(encoding="utf-8"))
+    if args.model:
+        settings["model"] = args.model
+    if args.api_url:
+        settings["apiUrl"] = args.api_url
+    if args.prompt_file:
+        settings["prompt"] = args.prompt_file.read_text(encoding="utf-8")
+
+    try:
+        summary = reprocess_documents(
+            str(args.uploads), settings, names=args.documents, version=args.version, concurrency=args.concurrency
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    for doc in summary["documents"]:
+        detail = doc.get("result_file") or doc.get("error")
+        print(f"  {doc['document']}: {doc['status']} ({detail})")
+    print(f"\nВерсия {summary['version']}: {summary['succeeded']}/{summary['total']} за {summary['seconds']:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Standalone OCR worker pulling documents from the shared job queue.
+
+Start any number of these on machines that see the same uploads folder; the
+web app (run with EXTRACTOR_QUEUE pointing to the same database) only
+enqueues documents and reads results.
+
+The queue stores settings without secrets. Each worker takes the LLM API key
+from EXTRACTOR_API_KEY or from its local settings file (--settings).
+
+Usage:
+    python worker.py --queue /mnt/shared/jobs.db --uploads /mnt/shared/uploads
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+
+from file_processing_backend.job_queue import LEASE_SECONDS, JobQueue, make_worker_id
+from file_processing_backend.reprocess import SECRET_SETTINGS
+from file_processing_backend.text_extractor import process_document, save_result_file, warm_up
+
+# Каждая попытка пишет результат и отладочные файлы в свою папку внутри uploads
+# и переносит их к PDF только после успешного complete(): воркер, у которого
+# отобрали аренду, не перезапишет файлы того, кто задачу завершил
+WORK_DIR = '.work'
+# Пауза после ошибки базы (блокировка дольше timeout, сбой общего хранилища)
+CLAIM_RETRY_SECONDS = 5.0
+API_KEY_ENV_VAR = 'EXTRACTOR_API_KEY'
+
+
+class LeaseKeeper:
+    """Фоновый heartbeat: продлевает аренду задачи, пока она обрабатывается"""
+
+    def __init__(self, job_queue, job_id, worker_id, interval):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.job_queue.heartbeat(self.job_id, self.worker_id):
+                    self.lost = True
+                    print(f"[WORKER] Аренда задачи {self.job_id} потеряна")
+                    return
+            except Exception as e:
+                print(f"[WORKER] Ошибка heartbeat: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def load_secrets(settings_file):
+    """Секреты воркера: из локального файла настроек, apiKey можно задать переменной окружения"""
+    secrets = {}
+    if settings_file and os.path.exists(settings_file):
+        try:
+            with open(settings_file, 'r', encoding='utf-8') as f:
+                local_settings = json.load(f)
+            secrets = {key: local_settings[key] for key in SECRET_SETTINGS if local_settings.get(key)}
+        except Exception as e:
+            print(f"[WORKER] Не удалось прочитать {settings_file}: {e}")
+    if os.environ.get(API_KEY_ENV_VAR):
+        secrets['apiKey'] = os.environ[API_KEY_ENV_VAR]
+    return secrets
+
+
+def publish_files(work_dir, uploads_dir, skip_name):
+    """Переносит файлы попытки в uploads (os.replace атомарен в пределах одной ФС)"""
+    for name in os.listdir(work_dir):
+        if name != skip_name:
+            os.replace(os.path.join(work_dir, name), os.path.join(uploads_dir, name))
+
+
+def run_job(job_queue, uploads_dir, job, worker_id, secrets=None):
+    # Без настроек process_document берёт промт по умолчанию — ключ к ним не добавляем
+    settings = dict(job['settings'], **(secrets or {})) if job['settings'] else None
+    work_dir = os.path.join(uploads_dir, WORK_DIR, f"{job['id']}-{worker_id}")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        pdf_path = os.path.join(work_dir, job['filename'])
+        stats = {}
+        with LeaseKeeper(job_queue, job['id'], worker_id, job_queue.lease_seconds / 3) as lease:
+            try:
+                shutil.copyfile(os.path.join(uploads_dir, job['filename']), pdf_path)
+                result = process_document(pdf_path, settings, stats=stats, profile=bool(job['profile']))
+            except Exception:
+                job_queue.fail(job['id'], worker_id, traceback.format_exc(limit=5))
+                return
+
+        if lease.lost or not job_queue.complete(job['id'], worker_id, result, stats):
+            # Задачу уже перезабрал другой воркер — его результат и будет записан
+            print(f"[WORKER] Задача {job['id']} завершена другим воркером, результат отброшен")
+            return
+        if result:
+            save_result_file(pdf_path, result)
+        publish_files(work_dir, uploads_dir, job['filename'])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_worker(job_queue, uploads_dir, worker_id, poll_interval=1.0, secrets=None):
+    warm_up()
+    print(f"[WORKER] {worker_id} ждёт задачи из {job_queue.db_path}")
+
+    while True:
+        try:
+            job = job_queue.claim(worker_id)
+        except sqlite3.OperationalError as e:
+            print(f"[WORKER] Очередь недоступна ({e}), повтор через {CLAIM_RETRY_SECONDS:.0f} с")
+            time.sleep(CLAIM_RETRY_SECONDS)
+            continue
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        print(f"[WORKER] Задача {job['id']}: {job['filename']} (попытка {job['attempts'] + 1})")
+        try:
+            run_job(job_queue, uploads_dir, job, worker_id, secrets)
+        except Exception:
+            # Сбой вне обработки (база при complete/fail, перенос файлов): аренда
+            # истечёт, и задачу заберут снова
+            print(f"[WORKER] Ошибка задачи {job['id']}:\n{traceback.format_exc(limit=5)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="OCR worker for the shared document queue.")
+    parser.add_argument("--queue", default=os.environ.get("EXTRACTOR_QUEUE", "jobs.db"), help="Путь к базе очереди (SQLite)")
+    parser.add_argument("--uploads", default="uploads", help="Папка загрузок (общая с веб-приложением)")
+    parser.add_argument("--lease", type=float, default=LEASE_SECONDS, help="Длительность аренды задачи, с")
+    parser.add_argument("--settings", default="settings.json",
+                        help="Локальный файл настроек, из которого берётся apiKey (переменная EXTRACTOR_API_KEY важнее)")
+    parser.add_argument("--poll", type=float, default=1.0, help="Пауза между опросами пустой очереди, с")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    job_queue = JobQueue(args.queue, lease_seconds=args.lease)
+    run_worker(job_queue, args.uploads, make_worker_id(), poll_interval=args.poll,
+               secrets=load_secrets(args.settings))
+
+
+if __name__ == '__main__':
+    main()